@@ -0,0 +1,33 @@
+"""add keyset pagination indexes
+
+Revision ID: 5b8e1f3a9d42
+Revises: c4a9e2d17b85
+Create Date: 2024-05-09 14:02:51.730218
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "5b8e1f3a9d42"
+down_revision = "c4a9e2d17b85"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index("event_record_id_idx", "event")
+    op.create_index("event_record_id_idx", "event", ["record_id", "id"])
+    op.drop_index("instrument_record_id_idx", "instrument")
+    op.create_index("instrument_record_id_idx", "instrument", ["record_id", "id"])
+    op.drop_index("event_record_record_id_idx", "event_record")
+    op.create_index("event_record_record_id_idx", "event_record", ["record_id", "id"])
+
+
+def downgrade():
+    op.drop_index("event_record_record_id_idx", "event_record")
+    op.create_index("event_record_record_id_idx", "event_record", ["record_id"])
+    op.drop_index("instrument_record_id_idx", "instrument")
+    op.create_index("instrument_record_id_idx", "instrument", ["record_id"])
+    op.drop_index("event_record_id_idx", "event")
+    op.create_index("event_record_id_idx", "event", ["record_id"])
@@ -1,30 +1,65 @@
+from enum import Enum
 from typing import AsyncGenerator, Callable, Generator, Optional
 
 from arq import create_pool
-from fastapi import Query
+from fastapi import HTTPException, Query
 from redcap.project import Project
 from sqlalchemy import Select
 from sqlalchemy.orm import Session
 
 from rss.db.session import SessionLocal
 from rss.models.event import Event
+from rss.models.event_record import EventRecord
 from rss.models.instrument import Instrument
 from rss.rqueue.worker import RedisQueue
+from rss.lib.cursor import Cursor
 from rss.lib.redcap_interface import redcap_environment
-from rss.view_models import event, instrument
+from rss.view_models import event, event_record, instrument
 
 ########################################################
 # Core Dependencies
 ########################################################
 
 
+class PageAlignment(Enum):
+    # Pages contain `per_page` rows, and may split the rows of a record across pages.
+    ROW = "row"
+    # Pages contain every row of `per_page` records.
+    RECORD = "record"
+
+
+class CountMode(Enum):
+    # The total count of the paginated query, cached until project data changes.
+    EXACT = "exact"
+    # The planner's estimate of the total count, which does not execute the query.
+    ESTIMATE = "estimate"
+    # No total count.
+    NONE = "none"
+
+
 class PaginatedParams:
-    def __init__(self, page: int = Query(1, ge=1), per_page: int = Query(2500, ge=0)):
+    def __init__(
+        self,
+        page: int = Query(1, ge=1),
+        per_page: int = Query(2500, ge=0),
+        cursor: Optional[str] = Query(None),
+        align: PageAlignment = Query(PageAlignment.ROW),
+        count: CountMode = Query(CountMode.EXACT),
+    ):
         self.page = page
         self.per_page = per_page
-        self.limit = per_page * page
+        self.align = align
+        self.count = count
+        self.limit = per_page
         self.offset = (page - 1) * per_page
 
+        # Pages are fetched by keyset when a cursor is provided, in which case `page` is
+        # ignored.
+        try:
+            self.cursor = Cursor.decode(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(422, str(e))
+
 
 def get_db() -> Generator:
     db = SessionLocal()
@@ -77,3 +112,14 @@ def get_instrument_calculator() -> (
     ]
 ):
     return None
+
+
+def get_event_record_calculator() -> (
+    Optional[
+        Callable[
+            [Session, Select[tuple[EventRecord]], list[str], PaginatedParams],
+            list[event_record.EventRecord],
+        ]
+    ]
+):
+    return None
@@ -0,0 +1,157 @@
+import logging
+import threading
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from rss.lib.project_state import structure_version
+from rss.models.project import (
+    ProjectEvent,
+    ProjectField,
+    ProjectInstrument,
+    event_instrument_association,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogInstrument:
+    def __init__(
+        self,
+        id: int,
+        name: str,
+        repeating: bool,
+        event_ids: list[int],
+        fields: list[str],
+    ):
+        self.id = id
+        self.name = name
+        self.repeating = repeating
+        self.event_ids = event_ids
+        self.fields = fields
+
+
+class SchemaCatalog:
+    """
+    An in-memory snapshot of the relational project structure, used to resolve event,
+    instrument, and field names without querying the database.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        events: dict[str, int],
+        instruments: dict[str, CatalogInstrument],
+        field_instruments: dict[str, str],
+    ):
+        self.version = version
+        self.events = events
+        self.instruments = instruments
+        self.field_instruments = field_instruments
+
+    def event_id(self, name: str) -> int:
+        event_id = self.events.get(name)
+
+        if event_id is None:
+            raise ValueError(f"Event {name} is not defined on this project instance.")
+
+        return event_id
+
+    def instrument(self, name: str) -> CatalogInstrument:
+        instrument = self.instruments.get(name)
+
+        if instrument is None:
+            raise ValueError(
+                f"Instrument {name} is not defined on this project instance."
+            )
+
+        return instrument
+
+    def field_instrument(self, name: str) -> CatalogInstrument:
+        """
+        The instrument which contains the provided field.
+        """
+        instrument = self.field_instruments.get(name)
+
+        if instrument is None:
+            raise ValueError(f"Field {name} is not defined on this project instance.")
+
+        return self.instruments[instrument]
+
+
+def load_catalog(db: Session) -> SchemaCatalog:
+    version = structure_version(db)
+
+    events = {
+        name: id for id, name in db.execute(select(ProjectEvent.id, ProjectEvent.name))
+    }
+
+    instrument_events: dict[int, list[int]] = {}
+    for event_id, instrument_id in db.execute(
+        select(
+            event_instrument_association.c.project_event_id,
+            event_instrument_association.c.project_instrument_id,
+        )
+    ):
+        instrument_events.setdefault(instrument_id, []).append(event_id)
+
+    instrument_fields: dict[int, list[str]] = {}
+    for name, instrument_id in db.execute(
+        select(ProjectField.name, ProjectField.instrument_id)
+    ):
+        instrument_fields.setdefault(instrument_id, []).append(name)
+
+    instruments = {
+        name: CatalogInstrument(
+            id=id,
+            name=name,
+            repeating=repeating,
+            event_ids=sorted(instrument_events.get(id, [])),
+            fields=sorted(instrument_fields.get(id, [])),
+        )
+        for id, name, repeating in db.execute(
+            select(
+                ProjectInstrument.id,
+                ProjectInstrument.name,
+                ProjectInstrument.repeating,
+            )
+        )
+    }
+
+    field_instruments = {
+        field: instrument.name
+        for instrument in instruments.values()
+        for field in instrument.fields
+    }
+
+    logger.info(f"Loaded schema catalog for project structure version {version}.")
+    return SchemaCatalog(version, events, instruments, field_instruments)
+
+
+_catalog: Optional[SchemaCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog(db: Session) -> SchemaCatalog:
+    """
+    The process-wide schema catalog. The structure version is read on each call, so changes
+    made by any process are seen immediately, but the catalog is only reloaded after it is
+    invalidated or the version changes.
+    """
+    global _catalog
+
+    version = structure_version(db)
+
+    with _catalog_lock:
+        if not _catalog or _catalog.version != version:
+            _catalog = load_catalog(db)
+
+        return _catalog
+
+
+def invalidate_catalog() -> None:
+    global _catalog
+
+    with _catalog_lock:
+        _catalog = None
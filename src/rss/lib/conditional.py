@@ -0,0 +1,52 @@
+import hashlib
+import json
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+
+def entity_tag(*parts: Any) -> str:
+    """
+    A strong entity tag for a representation derived entirely from the provided parts, which
+    must be JSON serializable or have a stable string form.
+    """
+    digest = hashlib.sha256(
+        json.dumps(parts, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def request_tag_parts(request: Request) -> list[Any]:
+    """
+    The parts of a request which select its representation: its path and query parameters.
+    Query parameters are sorted, so their order does not change the entity tag.
+    """
+    return [request.url.path, sorted(request.query_params.multi_items())]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an `If-None-Match` header matches the provided entity tag. `If-None-Match` uses
+    the weak comparison, so weak validators match their strong counterparts.
+    """
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """
+    A `304 Not Modified` response if the client already holds the representation with the
+    provided entity tag, otherwise `None`.
+    """
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return None
@@ -0,0 +1,42 @@
+import base64
+import binascii
+import json
+from enum import Enum
+
+
+class CursorDirection(Enum):
+    # The page following the cursor's key.
+    NEXT = "next"
+    # The page preceding the cursor's key.
+    PREVIOUS = "previous"
+
+
+# The (record_id, id) of the row a cursor points at.
+CursorKey = tuple[int, int]
+
+
+class Cursor:
+    """
+    A position within a paginated report, pointing at the row before or after which the
+    next page starts. Cursors are passed to clients as opaque strings.
+    """
+
+    def __init__(self, direction: CursorDirection, key: CursorKey):
+        self.direction = direction
+        self.key = key
+
+    def encode(self) -> str:
+        cursor = json.dumps([self.direction.value, *self.key])
+        return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+    @classmethod
+    def decode(cls, cursor: str) -> "Cursor":
+        """
+        Decodes a cursor previously returned to a client. Raises a `ValueError` if the
+        cursor is malformed.
+        """
+        try:
+            direction, record_id, id = json.loads(base64.urlsafe_b64decode(cursor))
+            return cls(CursorDirection(direction), (int(record_id), int(id)))
+        except (binascii.Error, TypeError, ValueError):
+            raise ValueError(f"Malformed pagination cursor: {cursor}")
@@ -0,0 +1,164 @@
+import csv
+import io
+import os
+from enum import Enum
+from typing import Iterator, Union
+
+from sqlalchemy import Select, Text, cast, select
+from sqlalchemy.orm import Session
+
+from rss.lib.catalog import get_catalog
+from rss.lib.report import project_data, report_row_json
+from rss.lib.report_plan import current_report_plan
+from rss.models.event import Event
+from rss.models.event_record import EventRecord
+from rss.models.instrument import Instrument
+from rss.models.report import Report
+
+# TODO Move these to a central config object.
+#
+# Rows are fetched from a server side cursor, and streamed, this many at a time.
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE") or 1000)
+
+
+class ExportFormat(Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+
+def export_fields(
+    db: Session, report: Report, model: type[Union[Event, Instrument, EventRecord]]
+) -> list[str]:
+    """
+    The data fields exported as CSV columns for a report. These are the report's fields if
+    it has any, otherwise the fields of the report's instruments, or of every instrument
+    on the project if the report is not scoped to any.
+    """
+    if report.fields:
+        return report.fields
+
+    plan = current_report_plan(db, report)
+    instruments = [
+        instrument
+        for instrument in get_catalog(db).instruments.values()
+        if not plan["instrument_ids"] or instrument.id in plan["instrument_ids"]
+    ]
+
+    # Consolidated rows only contain data from non-repeating instruments.
+    if model is EventRecord:
+        instruments = [
+            instrument for instrument in instruments if not instrument.repeating
+        ]
+
+    return [field for instrument in instruments for field in instrument.fields]
+
+
+def stream_ndjson(
+    db: Session,
+    report: Report,
+    query: Select,
+    model: type[Union[Event, Instrument, EventRecord]],
+) -> Iterator[str]:
+    """
+    Streams the rows selected by a report query as newline delimited JSON, in the shape of
+    the model's view model, ordered by record. Rows are built as JSON within Postgres and
+    fetched in batches from a server side cursor.
+    """
+    fields = (
+        current_report_plan(db, report)["consolidated_fields"]
+        if model is EventRecord
+        else report.fields
+    )
+
+    rows = query.subquery()
+    result = db.execute(
+        select(cast(report_row_json(model, fields)(rows), Text))
+        .order_by(rows.c.record_id, rows.c.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    for partition in result.scalars().partitions():
+        yield "\n".join(partition) + "\n"
+
+
+def stream_csv(
+    db: Session,
+    report: Report,
+    query: Select,
+    model: type[Union[Event, Instrument, EventRecord]],
+) -> Iterator[str]:
+    """
+    Streams the rows selected by a report query as CSV, with a column per exported data
+    field, ordered by record. Rows are fetched in batches from a server side cursor.
+    """
+    catalog = get_catalog(db)
+    event_names = {id: name for name, id in catalog.events.items()}
+    instrument_names = {
+        instrument.id: name for name, instrument in catalog.instruments.items()
+    }
+    fields = export_fields(db, report, model)
+
+    rows = query.subquery()
+    columns = [rows.c.record_id, rows.c.event_id]
+    header = ["record_id", "event"]
+
+    if model is not EventRecord:
+        columns.append(rows.c.instrument_id)
+        header.append("instrument")
+
+    columns += [
+        rows.c.repeat_instance,
+        project_data(rows.c.data, fields).label("data"),
+    ]
+    header += ["repeat_instance", *fields]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    result = db.execute(
+        select(*columns)
+        .order_by(rows.c.record_id, rows.c.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    for partition in result.partitions():
+        for row in partition:
+            data = row.data or {}
+            structure = [row.record_id, event_names.get(row.event_id)]
+            if model is not EventRecord:
+                structure.append(instrument_names.get(row.instrument_id))
+
+            writer.writerow(
+                [
+                    *structure,
+                    row.repeat_instance,
+                    *(data.get(field) for field in fields),
+                ]
+            )
+
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def stream_export(
+    db: Session,
+    report: Report,
+    query: Select,
+    model: type[Union[Event, Instrument, EventRecord]],
+    export_format: ExportFormat,
+) -> Iterator[str]:
+    if export_format is ExportFormat.CSV:
+        return stream_csv(db, report, query, model)
+
+    return stream_ndjson(db, report, query, model)
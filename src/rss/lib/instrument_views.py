@@ -0,0 +1,226 @@
+import hashlib
+import logging
+from typing import Optional, Union
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    ColumnElement,
+    Date,
+    DateTime,
+    Numeric,
+    Select,
+    case,
+    cast,
+    func,
+    select,
+    text,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from rss.lib.redcap_interface import non_repeating_model
+from rss.models.event import Event
+from rss.models.event_record import EventRecord
+from rss.models.instrument import Instrument
+from rss.models.project import ProjectField, ProjectInstrument
+
+logger = logging.getLogger(__name__)
+
+VIEW_PREFIX = "instrument_view_"
+
+# Columns every instrument view contains. Fields sharing one of these names (such as the
+# REDCap record id field, which is stored outside of the data blob) are not duplicated.
+BASE_COLUMNS = ("id", "record_id", "event_id", "repeat_instance")
+
+# REDCap exports typed values as strings. Values are only cast when they match the
+# expected format, so malformed data becomes NULL rather than failing the refresh. Integers
+# are bounded to 18 digits, which always fit a BIGINT.
+INTEGER_PATTERN = "^-?[0-9]{1,18}$"
+NUMERIC_PATTERN = "^-?[0-9]*[.]?[0-9]+$"
+BOOLEAN_PATTERN = "^[01]$"
+DATE_PATTERN = "^[0-9]{4}-[0-9]{2}-[0-9]{2}$"
+DATETIME_PATTERN = "^[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}(:[0-9]{2})?$"
+
+# Well formatted dates may still be impossible (such as 2024-02-31), which fails a cast. Dates
+# and datetimes are cast through these functions instead, which return NULL on failure.
+CAST_FUNCTIONS = {Date: "try_cast_date", DateTime: "try_cast_timestamp"}
+CAST_FUNCTION_DEFINITION = """
+CREATE OR REPLACE FUNCTION {name}(value text) RETURNS {type} AS $$
+BEGIN
+    RETURN value::{type};
+EXCEPTION WHEN data_exception THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql STABLE
+"""
+
+
+def instrument_view_name(instrument_name: str) -> str:
+    # Postgres truncates identifiers longer than 63 characters.
+    return f"{VIEW_PREFIX}{instrument_name}"[:63]
+
+
+def _field_type(field: ProjectField) -> tuple[Optional[type], Optional[str]]:
+    """
+    The SQL type and format pattern values of the provided field should be cast with. Fields
+    without a known type are left as text.
+    """
+    validation = field.validation or ""
+
+    if validation == "integer" or field.field_type in ("slider", "checkbox"):
+        return BigInteger, INTEGER_PATTERN
+    elif validation.startswith("number") or field.field_type == "calc":
+        return Numeric, NUMERIC_PATTERN
+    elif validation.startswith("datetime"):
+        return DateTime, DATETIME_PATTERN
+    elif validation.startswith("date"):
+        return Date, DATE_PATTERN
+    elif field.field_type in ("yesno", "truefalse"):
+        return Boolean, BOOLEAN_PATTERN
+
+    return None, None
+
+
+def _typed_value(value: ColumnElement[str], field: ProjectField) -> ColumnElement:
+    """
+    Casts the provided text value to the type of the provided field, or NULL if the value
+    can not be cast. Values of fields without a known type are left as text.
+    """
+    sql_type, pattern = _field_type(field)
+
+    if sql_type in CAST_FUNCTIONS:
+        typed = getattr(func, CAST_FUNCTIONS[sql_type])(value, type_=sql_type)
+    elif sql_type:
+        typed = cast(value, sql_type)
+    else:
+        return func.nullif(value, "")
+
+    return case((value.regexp_match(pattern), typed))
+
+
+def create_cast_functions(db: Session) -> None:
+    for sql_type, name in CAST_FUNCTIONS.items():
+        type_name = sql_type().compile(dialect=postgresql.dialect())
+        db.execute(text(CAST_FUNCTION_DEFINITION.format(name=name, type=type_name)))
+
+
+def _instrument_view_select(
+    instrument: ProjectInstrument,
+) -> Select:
+    """
+    Constructs a select with one typed column per field of the provided instrument from the
+    JSONB data blobs of the model the instrument's data is stored within.
+    """
+    model: Union[type[Event], type[Instrument], type[EventRecord]] = (
+        Instrument if instrument.repeating else non_repeating_model()
+    )
+
+    columns = []
+    for field in sorted(instrument.fields, key=lambda field: field.name):
+        if field.name in BASE_COLUMNS:
+            continue
+
+        columns.append(
+            _typed_value(model.data[field.name].astext, field).label(field.name)
+        )
+
+    view_select = select(
+        model.id, model.record_id, model.event_id, model.repeat_instance, *columns
+    )
+
+    if model is EventRecord:
+        return view_select.where(
+            model.event_id.in_(sorted(event.id for event in instrument.events))
+        )
+
+    return view_select.where(model.instrument_id == instrument.id)
+
+
+def _definition_hash(definition: str) -> str:
+    return hashlib.sha256(definition.encode()).hexdigest()
+
+
+def _quote(db: Session, identifier: str) -> str:
+    return db.get_bind().dialect.identifier_preparer.quote(identifier)
+
+
+def _existing_views(db: Session) -> dict[str, Optional[str]]:
+    """
+    Maps existing instrument view names to the definition hash they were created with.
+    """
+    return {
+        row.relname: row.definition
+        for row in db.execute(
+            text(
+                "SELECT relname, obj_description(oid, 'pg_class') AS definition FROM pg_class "
+                "WHERE relkind = 'm' AND left(relname, :length) = :prefix"
+            ),
+            {"length": len(VIEW_PREFIX), "prefix": VIEW_PREFIX},
+        )
+    }
+
+
+def create_instrument_view(db: Session, name: str, definition: str) -> None:
+    view = _quote(db, name)
+
+    db.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {view}"))
+    db.execute(text(f"CREATE MATERIALIZED VIEW {view} AS {definition}"))
+
+    # A unique index is required to refresh materialized views concurrently.
+    db.execute(text(f"CREATE UNIQUE INDEX ON {view} (id)"))
+    db.execute(text(f"CREATE INDEX ON {view} (record_id)"))
+    db.execute(text(f"CREATE INDEX ON {view} (event_id)"))
+    db.execute(
+        text(f"COMMENT ON MATERIALIZED VIEW {view} IS '{_definition_hash(definition)}'")
+    )
+
+
+def sync_instrument_views(db: Session, instruments: Optional[list[str]] = None) -> None:
+    """
+    Creates or refreshes one materialized view per project instrument, with one typed column
+    per project field. Views whose definition changed since they were created (because fields
+    were added or retyped) are rebuilt, views which are current are refreshed concurrently,
+    and views of instruments no longer in the project are dropped.
+
+    If a list of instrument names is provided, only views of those instruments are synced.
+    """
+    create_cast_functions(db)
+
+    existing_views = _existing_views(db)
+    project_instruments = db.scalars(select(ProjectInstrument)).all()
+
+    synced_views = set()
+    for instrument in project_instruments:
+        name = instrument_view_name(instrument.name)
+        synced_views.add(name)
+
+        if instruments is not None and instrument.name not in instruments:
+            continue
+
+        definition = str(
+            _instrument_view_select(instrument).compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+            )
+        )
+
+        if existing_views.get(name) == _definition_hash(definition):
+            logger.debug(f"Refreshing instrument view {name}.")
+            db.execute(
+                text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {_quote(db, name)}")
+            )
+        else:
+            logger.debug(f"Instrument view {name} is missing or stale. Rebuilding.")
+            create_instrument_view(db, name, definition)
+
+    if instruments is None:
+        for name in set(existing_views) - synced_views:
+            logger.debug(f"Dropping instrument view {name} of removed instrument.")
+            db.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {_quote(db, name)}"))
+
+    logger.info(f"Done syncing {len(synced_views)} instrument views.")
+
+
+def drop_instrument_views(db: Session) -> None:
+    for name in _existing_views(db):
+        db.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {_quote(db, name)}"))
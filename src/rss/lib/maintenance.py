@@ -0,0 +1,376 @@
+import hashlib
+import logging
+import math
+import os
+from typing import Iterator, Optional, Union
+
+from sqlalchemy import Boolean, Integer, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from rss.lib.querybuilder.compiler import filter_criterions
+from rss.lib.querybuilder.operators import comparison_cast
+from rss.lib.redcap_interface import non_repeating_model
+from rss.models.event import Event
+from rss.models.event_record import EventRecord
+from rss.models.instrument import Instrument
+from rss.models.project import ProjectInstrument
+from rss.models.report import Report
+
+logger = logging.getLogger(__name__)
+
+# TODO Move these to a central config object.
+STATISTICS_TARGET = int(os.getenv("MAINTENANCE_STATISTICS_TARGET") or 1000)
+INDEX_BLOAT_THRESHOLD = float(os.getenv("MAINTENANCE_INDEX_BLOAT_THRESHOLD") or 2.0)
+INDEX_MIN_REBUILD_PAGES = int(os.getenv("MAINTENANCE_INDEX_MIN_REBUILD_PAGES") or 128)
+
+DATA_TABLES = [Event.__tablename__, EventRecord.__tablename__, Instrument.__tablename__]
+
+# Size estimates used when approximating how large a freshly built btree index would be.
+PAGE_SIZE = 8192
+BTREE_FILL_FACTOR = 0.9
+INDEX_TUPLE_OVERHEAD = 12
+
+# Expression statistics were introduced in Postgres 14.
+EXPRESSION_STATISTICS_MIN_VERSION = 140000
+
+
+def planner_row_estimates(db: Session, tables: list[str]) -> dict[str, int]:
+    """
+    The number of rows the planner currently believes each provided table contains.
+    """
+    return {
+        row.relname: int(row.reltuples)
+        for row in db.execute(
+            text(
+                "SELECT relname, reltuples FROM pg_class "
+                "WHERE relkind = 'r' AND relname = ANY(:tables) "
+                "AND relnamespace = to_regnamespace(current_schema())"
+            ),
+            {"tables": tables},
+        )
+    }
+
+
+# A hot field, and the SQL type it is cast to when filters compare against it, if any.
+HotField = tuple[str, Optional[str]]
+
+# The SQL types fields are cast to by `comparison_clause`, which statistics expressions must
+# match exactly for the planner to use them.
+STATISTICS_CASTS = {Boolean: "boolean", Integer: "integer"}
+
+# Names of the statistics objects and prefix indexes created by maintenance. See
+# `_statistics_name` and `_prefix_index_name`.
+STATISTICS_NAME_PATTERN = r"_[0-9a-f]{8}_stx$"
+PREFIX_INDEX_NAME_PATTERN = r"_[0-9a-f]{8}_pfx$"
+
+
+def _report_criterions(db: Session) -> Iterator[tuple[str, dict]]:
+    """
+    Each criterion of the saved report filters which compares a field, along with the data
+    table the compared field is stored in.
+    """
+    repeating_instruments: dict[str, bool] = {
+        name: repeating
+        for name, repeating in db.execute(
+            select(ProjectInstrument.name, ProjectInstrument.repeating)
+        )
+    }
+
+    for filters in db.scalars(select(Report.filters)):
+        for criterion in filter_criterions(filters or {}):
+            instrument, field = criterion.get("instrument"), criterion.get("field")
+            if instrument not in repeating_instruments or not isinstance(field, str):
+                continue
+
+            model: Union[type[Event], type[Instrument], type[EventRecord]] = (
+                Instrument
+                if repeating_instruments[instrument]
+                else non_repeating_model()
+            )
+            yield model.__tablename__, criterion
+
+
+def hot_report_fields(db: Session) -> dict[str, set[HotField]]:
+    """
+    Maps data tables to the fields saved report filters compare against, along with the type
+    each is cast to when compared. These are the JSONB expressions the planner has to estimate
+    when rendering reports.
+    """
+    hot_fields: dict[str, set[HotField]] = {}
+    for table, criterion in _report_criterions(db):
+        # Aggregate criterions are compared per record rather than per row, so only the
+        # text of their fields is estimated.
+        cast = None
+        if criterion.get("aggregate") is None:
+            try:
+                cast = comparison_cast(
+                    criterion.get("operator"), criterion.get("value")  # type: ignore
+                )
+            except ValueError:
+                continue
+
+        hot_fields.setdefault(table, set()).add(
+            (criterion["field"], STATISTICS_CASTS[cast] if cast is not None else None)
+        )
+
+    return hot_fields
+
+
+def prefix_report_fields(db: Session) -> dict[str, set[str]]:
+    """
+    Maps data tables to the fields saved report filters match a prefix of.
+    """
+    prefix_fields: dict[str, set[str]] = {}
+    for table, criterion in _report_criterions(db):
+        if criterion.get("operator") == "prefix" and criterion.get("aggregate") is None:
+            prefix_fields.setdefault(table, set()).add(criterion["field"])
+
+    return prefix_fields
+
+
+def _statistics_name(table: str, field: HotField) -> str:
+    # Identifiers are limited to 63 characters, so disambiguate truncated names with a digest.
+    name, cast = field
+    digest = hashlib.sha1(f"{table}.{name}::{cast}".encode()).hexdigest()[:8]
+    return f"{table}_{name}"[:46] + f"_{digest}_stx"
+
+
+def _statistics_expression(field: HotField) -> str:
+    """
+    The expression filters on a field compile to, as they are compared by `comparison_clause`.
+    """
+    name, cast = field
+    expression = "(data ->> '{}')".format(name.replace("'", "''"))
+
+    if cast is None:
+        return expression
+
+    return f"CAST({expression} AS {cast})"
+
+
+def _prefix_index_name(table: str, field: str) -> str:
+    digest = hashlib.sha1(f"{table}.{field}".encode()).hexdigest()[:8]
+    return f"{table}_{field}"[:46] + f"_{digest}_pfx"
+
+
+def expression_statistics_supported(db: Session) -> bool:
+    server_version = int(db.scalar(text("SHOW server_version_num")) or 0)
+    return server_version >= EXPRESSION_STATISTICS_MIN_VERSION
+
+
+def sync_statistics(db: Session, table: str, hot_fields: set[HotField]) -> None:
+    """
+    Collect expression statistics with a raised statistics target for each hot JSONB field of
+    a table, so the planner can estimate the selectivity of report filters. Statistics of
+    fields which are no longer hot are dropped.
+    """
+    preparer = db.get_bind().dialect.identifier_preparer
+    wanted = {_statistics_name(table, field): field for field in hot_fields}
+
+    existing = db.scalars(
+        text(
+            "SELECT s.stxname FROM pg_statistic_ext s "
+            "JOIN pg_class c ON c.oid = s.stxrelid "
+            "WHERE c.relname = :table AND s.stxname ~ :pattern "
+            "AND s.stxnamespace = to_regnamespace(current_schema())"
+        ),
+        {"table": table, "pattern": STATISTICS_NAME_PATTERN},
+    ).all()
+
+    for name in set(existing) - set(wanted):
+        db.execute(text(f"DROP STATISTICS IF EXISTS {preparer.quote(name)}"))
+        logger.debug(f"Dropped statistics {name} of {table}, which are no longer hot.")
+
+    for name, field in sorted(wanted.items()):
+        statistics = preparer.quote(name)
+
+        db.execute(
+            text(
+                f"CREATE STATISTICS IF NOT EXISTS {statistics} "
+                f"ON ({_statistics_expression(field)}) FROM {preparer.quote(table)}"
+            )
+        )
+        db.execute(
+            text(f"ALTER STATISTICS {statistics} SET STATISTICS {STATISTICS_TARGET}")
+        )
+        logger.debug(
+            f"Raised statistics target of {table}.{_statistics_expression(field)}."
+        )
+
+
+def analyze_table(db: Session, table: str, hot_fields: set[HotField]) -> None:
+    """
+    Analyze a table, collecting statistics for its hot fields if the server supports it.
+
+    Analyzing evaluates cast expressions against every sampled row, so it fails if any value
+    of a hot field does not cast. In that case the table is analyzed again with statistics on
+    the text of its hot fields only.
+    """
+    preparer = db.get_bind().dialect.identifier_preparer
+    if not expression_statistics_supported(db):
+        logger.info(
+            f"Expression statistics require Postgres 14 or later. Skipping statistics for {hot_fields}."
+        )
+        hot_fields = set()
+
+    try:
+        with db.begin_nested():
+            sync_statistics(db, table, hot_fields)
+            db.execute(text(f"ANALYZE {preparer.quote(table)}"))
+    except DBAPIError as e:
+        logger.warning(
+            f"Could not analyze {table} with statistics on cast fields. Falling back to text: {e}"
+        )
+        with db.begin_nested():
+            sync_statistics(db, table, {(name, None) for name, _ in hot_fields})
+            db.execute(text(f"ANALYZE {preparer.quote(table)}"))
+
+    logger.debug(f"Analyzed table {table}.")
+
+
+def bloated_indexes(db: Session, tables: list[str]) -> list[str]:
+    """
+    Btree indexes on the provided tables which are substantially larger than a freshly built
+    index holding the same rows would be. Index size is approximated from the planner's row
+    estimates and the average width of the indexed columns, so tables should be analyzed first.
+    """
+    rows = db.execute(
+        text(
+            "SELECT i.relname AS index_name, pg_relation_size(i.oid) AS index_bytes, "
+            "c.reltuples AS tuples, ("
+            "  SELECT sum(s.avg_width) FROM pg_attribute a JOIN pg_stats s "
+            "  ON s.schemaname = n.nspname AND s.tablename = c.relname AND s.attname = a.attname "
+            "  WHERE a.attrelid = c.oid AND a.attnum = ANY(x.indkey)"
+            ") AS key_width "
+            "FROM pg_index x "
+            "JOIN pg_class i ON i.oid = x.indexrelid "
+            "JOIN pg_class c ON c.oid = x.indrelid "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "JOIN pg_am am ON am.oid = i.relam "
+            "WHERE am.amname = 'btree' AND c.relname = ANY(:tables) "
+            "AND n.nspname = current_schema()"
+        ),
+        {"tables": tables},
+    )
+
+    bloated = []
+    for row in rows:
+        pages = row.index_bytes / PAGE_SIZE
+        if pages < INDEX_MIN_REBUILD_PAGES:
+            continue
+
+        tuple_width = (row.key_width or 8) + INDEX_TUPLE_OVERHEAD
+        expected_pages = math.ceil(
+            max(row.tuples, 0) * tuple_width / (PAGE_SIZE * BTREE_FILL_FACTOR)
+        )
+
+        if pages / max(expected_pages, 1) > INDEX_BLOAT_THRESHOLD:
+            logger.debug(
+                f"Index {row.index_name} is {pages:.0f} pages, but is expected to be {expected_pages}."
+            )
+            bloated.append(row.index_name)
+
+    return bloated
+
+
+def rebuild_indexes(db: Session, indexes: list[str]) -> None:
+    """
+    Rebuild the provided indexes without locking out writes. Concurrent reindexing may not
+    run inside a transaction block, so this uses its own autocommit connection.
+    """
+    if not indexes:
+        return
+
+    engine = db.get_bind()
+    preparer = engine.dialect.identifier_preparer
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for index in indexes:
+            connection.execute(
+                text(f"REINDEX INDEX CONCURRENTLY {preparer.quote(index)}")
+            )
+            logger.info(f"Rebuilt bloated index {index}.")
+
+
+def sync_prefix_indexes(db: Session, table: str, prefix_fields: set[str]) -> None:
+    """
+    Maintain a `text_pattern_ops` expression index for each field of a table which saved
+    report filters match a prefix of, so prefix criterions compile to index range scans.
+    Indexes of fields no longer matched, and indexes left invalid by a failed build, are
+    dropped. Like `rebuild_indexes`, indexes are built concurrently on their own autocommit
+    connection, so the passed session must not hold an open transaction.
+    """
+    engine = db.get_bind()
+    preparer = engine.dialect.identifier_preparer
+    wanted = {_prefix_index_name(table, field): field for field in prefix_fields}
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        existing = {
+            row.index_name: row.valid
+            for row in connection.execute(
+                text(
+                    "SELECT i.relname AS index_name, x.indisvalid AS valid FROM pg_index x "
+                    "JOIN pg_class i ON i.oid = x.indexrelid "
+                    "JOIN pg_class c ON c.oid = x.indrelid "
+                    "WHERE c.relname = :table AND i.relname ~ :pattern "
+                    "AND c.relnamespace = to_regnamespace(current_schema())"
+                ),
+                {"table": table, "pattern": PREFIX_INDEX_NAME_PATTERN},
+            )
+        }
+
+        for name, valid in existing.items():
+            if name in wanted and valid:
+                continue
+
+            connection.execute(
+                text(f"DROP INDEX CONCURRENTLY IF EXISTS {preparer.quote(name)}")
+            )
+            logger.debug(f"Dropped prefix index {name} of {table}.")
+
+        for name, field in sorted(wanted.items()):
+            if existing.get(name):
+                continue
+
+            connection.execute(
+                text(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {preparer.quote(name)} "
+                    f"ON {preparer.quote(table)} ({_statistics_expression((field, None))} "
+                    "text_pattern_ops)"
+                )
+            )
+            logger.info(f"Created prefix index {name} on {table}.")
+
+
+def post_load_maintenance(
+    db: Session, tables: list[str] = DATA_TABLES
+) -> dict[str, dict[str, int]]:
+    """
+    Brings planner statistics up to date after a bulk load rather than waiting on autovacuum.
+    Statistics are collected for the JSONB expressions saved report filters use and dropped
+    for those no longer used, and touched tables are analyzed. Prefix indexes are synced with
+    the prefix criterions of saved reports, and bloated indexes are rebuilt, concurrently.
+    This commits the passed session.
+
+    Returns the planner visible row estimates of each table from before and after maintenance.
+    """
+    estimates_before = planner_row_estimates(db, tables)
+
+    hot_fields = hot_report_fields(db)
+    prefix_fields = prefix_report_fields(db)
+    for table in tables:
+        analyze_table(db, table, hot_fields.get(table, set()))
+    db.commit()
+
+    for table in tables:
+        sync_prefix_indexes(db, table, prefix_fields.get(table, set()))
+
+    rebuild_indexes(db, bloated_indexes(db, tables))
+
+    estimates_after = planner_row_estimates(db, tables)
+    for table in tables:
+        logger.info(
+            f"Planner row estimate for {table} went from {estimates_before.get(table)} to {estimates_after.get(table)}."
+        )
+
+    return {"before": estimates_before, "after": estimates_after}
@@ -1,75 +1,282 @@
-from typing import Optional
-from sqlalchemy import Select, func, select
+import json
+import os
+from typing import Any, Callable, Hashable, Iterable, Optional
+from sqlalchemy import FromClause, Select, Text, cast, func, select, tuple_
+from sqlalchemy.dialects.postgresql import array
 from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
 
+from rss.lib.cache import LRUCache
+from rss.lib.cursor import Cursor, CursorDirection, CursorKey
 from rss.lib.middlewares import request_object
-from rss.deps import PaginatedParams
+from rss.lib.querybuilder.planner import estimate_rows
+from rss.deps import CountMode, PageAlignment, PaginatedParams
+
+# TODO Move these to a central config object.
+COUNT_CACHE_SIZE = int(os.getenv("COUNT_CACHE_SIZE") or 512)
+
+# Total counts of paginated queries, keyed by the count key their caller provided and their
+# alignment, so each page of a report after the first reuses its count.
+count_cache: LRUCache[int] = LRUCache(COUNT_CACHE_SIZE)
 
 
 class Paginator:
-    def __init__(self, session: Session, query: Select, page_params: PaginatedParams):
+    """
+    Paginates a query over the key (record_id, id), leaving how pages are rendered to
+    subclasses. Pages are fetched by offset when a page number is requested, and by keyset
+    when a cursor is, so following the cursors of a page costs the same regardless of how
+    deep into the query the page is.
+
+    Record aligned pages are paginated over the distinct record ids of the query instead,
+    and contain every row of their records.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        query: Select,
+        page_params: PaginatedParams,
+        count_key: Optional[Hashable] = None,
+    ):
         self.session = session
         self.query = query
         self.params = page_params
+        self.count_key = count_key
         self.request = request_object.get()
 
         # computed later
-        self.number_of_pages = 0
-        self.next_page = ""
-        self.previous_page = ""
+        self.number_of_pages: Optional[int] = 0
+        self.next_cursor: Optional[str] = None
+        self.previous_cursor: Optional[str] = None
 
-    def _get_next_page(self) -> Optional[str]:
-        if self.params.page >= self.number_of_pages:
+    def _get_page_link(self, cursor: Optional[str]) -> Optional[str]:
+        if cursor is None:
             return
 
-        url = self.request.url.include_query_params(page=self.params.page + 1)
+        url = self.request.url.remove_query_params("page").include_query_params(
+            cursor=cursor
+        )
 
         # TODO: Manually set HTTPS scheme as URL since load balanced requests are HTTP based
         return str(url.replace(scheme="https"))
 
+    def _get_next_page(self) -> Optional[str]:
+        return self._get_page_link(self.next_cursor)
+
     def _get_previous_page(self) -> Optional[str]:
-        if self.params.page == 1 or self.params.page > self.number_of_pages + 1:
+        return self._get_page_link(self.previous_cursor)
+
+    def _is_backward(self) -> bool:
+        return (
+            self.params.cursor is not None
+            and self.params.cursor.direction is CursorDirection.PREVIOUS
+        )
+
+    def _is_record_aligned(self) -> bool:
+        return self.params.align is PageAlignment.RECORD
+
+    def _paged_query(self) -> Select:
+        """
+        The query pages are taken from: the rows of the query, or the distinct record ids of
+        the query if pages are record aligned.
+        """
+        if self._is_record_aligned():
+            rows = self.query.subquery()
+            return select(rows.c.record_id).group_by(rows.c.record_id)
+
+        return self.query
+
+    def _page_query(self) -> Select:
+        """
+        The query for the requested page, in the direction it is fetched. One row beyond the
+        page is fetched, to determine whether another page follows it.
+        """
+        paged_query = self._paged_query()
+        key = [paged_query.selected_columns.record_id]
+        if not self._is_record_aligned():
+            key.append(paged_query.selected_columns.id)
+
+        cursor = self.params.cursor
+
+        if cursor is None:
+            return (
+                paged_query.order_by(*key)
+                .limit(self.params.limit + 1)
+                .offset(self.params.offset)
+            )
+
+        cursor_key = tuple_(*cursor.key[: len(key)])
+
+        if cursor.direction is CursorDirection.NEXT:
+            page_query = paged_query.where(tuple_(*key) > cursor_key)
+            return page_query.order_by(*key).limit(self.params.limit + 1)
+
+        page_query = paged_query.where(tuple_(*key) < cursor_key)
+        return page_query.order_by(*(column.desc() for column in key)).limit(
+            self.params.limit + 1
+        )
+
+    def _set_cursors(
+        self, fetched: int, first: Optional[CursorKey], last: Optional[CursorKey]
+    ) -> None:
+        """
+        Sets the cursors surrounding the fetched page, which begins with the row keyed by
+        `first` and ends with the row keyed by `last`.
+        """
+        if first is None or last is None:
             return
 
-        url = self.request.url.include_query_params(page=self.params.page - 1)
-        return str(url.replace(scheme="https"))
+        has_more = fetched > self.params.per_page
+        if self.params.cursor is None:
+            has_next, has_previous = has_more, self.params.offset > 0
+        elif self._is_backward():
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, True
 
-    def get_response(self) -> dict:
-        count = self._get_total_count()
-        return {
-            "count": count,
-            "pages": self._get_number_of_pages(count),
-            "next_page": self._get_next_page(),
-            "previous_page": self._get_previous_page(),
-            "items": [
-                row
-                for row in self.session.scalars(
-                    self.query.limit(self.params.limit).offset(self.params.offset)
-                )
-            ],
-        }
+        if has_next:
+            self.next_cursor = Cursor(CursorDirection.NEXT, last).encode()
+        if has_previous:
+            self.previous_cursor = Cursor(CursorDirection.PREVIOUS, first).encode()
+
+    def _get_number_of_pages(self, count: Optional[int]) -> Optional[int]:
+        if count is None:
+            return None
 
-    def _get_number_of_pages(self, count: int) -> int:
         rest = count % self.params.per_page
         quotient = count // self.params.per_page
         return max(1, quotient) if not rest else quotient + 1
 
-    def _get_total_count(self) -> int:
-        count = self.session.scalar(
-            select(func.count()).select_from(self.query.subquery())
-        )
+    def _get_total_count(self) -> Optional[int]:
+        """
+        The total count of rows, or records if pages are record aligned, in the requested
+        count mode. Exact counts are cached if the paginator was given a count key, which
+        must identify the paginated query's rows, including the data generation they are at.
+        """
+        paged_query = self._paged_query()
+
+        if self.params.count is CountMode.NONE:
+            return None
+
+        if self.params.count is CountMode.ESTIMATE:
+            count = round(estimate_rows(self.session, paged_query))
+        else:
+            key = (self.count_key, self.params.align.value)
+            count = count_cache.get(key) if self.count_key is not None else None
+
+            if count is None:
+                count = self.session.scalar(
+                    select(func.count()).select_from(paged_query.subquery())
+                )
+                count = count or 0
 
-        if not count:
-            count = 0
+                if self.count_key is not None:
+                    count_cache.set(key, count)
 
         self.number_of_pages = self._get_number_of_pages(count)
         return count
 
 
-def paginate(
+class JSONPaginator(Paginator):
+    """
+    Paginates a query, building the JSON of the page's items within Postgres rather than
+    loading, validating, and encoding them in Python. Items are rendered by `items_json`,
+    which aggregates the rows of the passed page into their JSON.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        query: Select,
+        page_params: PaginatedParams,
+        items_json: Callable[[FromClause], ColumnElement],
+        extra_items_key: Optional[str] = None,
+        count_key: Optional[Hashable] = None,
+    ):
+        super().__init__(session, query, page_params, count_key)
+        self.items_json = items_json
+        self.extra_items_key = extra_items_key
+
+    def get_response(self, extra_items: Iterable[Any] = ()) -> bytes:
+        """
+        The encoded page. Any `extra_items`, which should be pydantic models, are encoded
+        individually and appended to the page's items, or placed under `extra_items_key`
+        if one was provided.
+        """
+        count = self._get_total_count()
+        items = self._get_items()
+        response = json.dumps(
+            {
+                "pages": self._get_number_of_pages(count),
+                "count": count,
+                "nextPage": self._get_next_page(),
+                "previousPage": self._get_previous_page(),
+                "nextCursor": self.next_cursor,
+                "previousCursor": self.previous_cursor,
+            }
+        )
+
+        encoded_extra_items = [
+            item.model_dump_json(by_alias=True) for item in extra_items
+        ]
+        if self.extra_items_key is not None:
+            extra = f"[{','.join(encoded_extra_items)}]"
+            return f'{response[:-1]}, "items": {items}, "{self.extra_items_key}": {extra}}}'.encode()
+
+        if encoded_extra_items:
+            page_items = [items[1:-1]] if items != "[]" else []
+            items = f"[{','.join([*page_items, *encoded_extra_items])}]"
+
+        return f'{response[:-1]}, "items": {items}}}'.encode()
+
+    def _get_items(self) -> str:
+        # The page is fetched once, along with the row or record beyond it, and its items
+        # are aggregated in key order along with the keys bounding them.
+        page = self._page_query().cte()
+        key = [page.c.record_id]
+        if not self._is_record_aligned():
+            key.append(page.c.id)
+
+        order = [column.desc() for column in key] if self._is_backward() else key
+        page_selection = select(page).order_by(*order).limit(self.params.per_page)
+
+        if self._is_record_aligned():
+            page_records = page_selection.subquery()
+            items = self.query.where(
+                self.query.selected_columns.record_id.in_(
+                    select(page_records.c.record_id)
+                )
+            ).cte()
+        else:
+            items = page_selection.cte()
+        item_key = array([items.c.record_id, items.c.id])
+
+        # The items are cast to text so the driver passes them through without decoding.
+        items_json, first, last, fetched = self.session.execute(
+            select(
+                cast(self.items_json(items), Text),
+                func.min(item_key),
+                func.max(item_key),
+                select(func.count()).select_from(page).scalar_subquery(),
+            ).select_from(items)
+        ).one()
+
+        if first is not None and last is not None:
+            self._set_cursors(fetched, tuple(first), tuple(last))
+
+        return items_json
+
+
+def paginate_json(
     db: Session,
     query: Select,
     page_params: PaginatedParams,
-) -> dict:
-    paginator = Paginator(db, query, page_params)
-    return paginator.get_response()
+    items_json: Callable[[FromClause], ColumnElement],
+    extra_items: Iterable[Any] = (),
+    extra_items_key: Optional[str] = None,
+    count_key: Optional[Hashable] = None,
+) -> bytes:
+    paginator = JSONPaginator(
+        db, query, page_params, items_json, extra_items_key, count_key
+    )
+    return paginator.get_response(extra_items)
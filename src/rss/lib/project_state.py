@@ -0,0 +1,121 @@
+import hashlib
+import json
+import logging
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from rss.models.project_state import ProjectState
+
+logger = logging.getLogger(__name__)
+
+# Project state is a single row table.
+PROJECT_STATE_ID = 1
+
+
+def get_project_state(db: Session) -> ProjectState:
+    """
+    Fetch the state of the relational REDCap project, creating it if it does not yet exist.
+    """
+    state = db.get(ProjectState, PROJECT_STATE_ID)
+
+    if not state:
+        state = ProjectState(
+            id=PROJECT_STATE_ID,
+            structure_fingerprint={},
+            structure_version=0,
+            data_generation=0,
+        )
+        db.add(state)
+        db.flush()
+        logger.debug("No project state existed. Created initial project state.")
+
+    return state
+
+
+def fingerprint(export: Any) -> str:
+    """
+    A stable fingerprint of some JSON serializable REDCap export.
+    """
+    return hashlib.sha256(
+        json.dumps(export, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def fingerprint_project_structure(structure: dict[str, Any]) -> dict[str, str]:
+    """
+    Fingerprint each element of an exported REDCap project structure.
+    """
+    return {element: fingerprint(export) for element, export in structure.items()}
+
+
+def changed_structure_elements(
+    db: Session, structure_fingerprint: dict[str, str]
+) -> set[str]:
+    """
+    The elements of the provided structure fingerprint which differ from those the
+    relational project structure was last synced from.
+    """
+    synced_fingerprint = get_project_state(db).structure_fingerprint
+    return {
+        element
+        for element, digest in structure_fingerprint.items()
+        if synced_fingerprint.get(element) != digest
+    }
+
+
+def record_structure_change(
+    db: Session, structure_fingerprint: dict[str, str]
+) -> ProjectState:
+    """
+    Record that the relational project structure was synced from a structure with the provided
+    fingerprint.
+    """
+    state = get_project_state(db)
+    state.structure_fingerprint = structure_fingerprint
+    state.structure_version += 1
+    db.flush()
+
+    logger.info(f"Project structure is now at version {state.structure_version}.")
+    return state
+
+
+def reset_project_structure(db: Session) -> ProjectState:
+    """
+    Forget the fingerprint of the synced project structure, so the next structure sync is
+    applied in full.
+    """
+    return record_structure_change(db, {})
+
+
+def data_generation(db: Session) -> int:
+    """
+    The current generation of project data. Anything derived from project data is valid for
+    as long as the generation it was derived at is current.
+    """
+    generation = db.scalar(
+        select(ProjectState.data_generation).where(ProjectState.id == PROJECT_STATE_ID)
+    )
+    return generation or 0
+
+
+def structure_version(db: Session) -> int:
+    """
+    The current version of the relational project structure.
+    """
+    version = db.scalar(
+        select(ProjectState.structure_version).where(
+            ProjectState.id == PROJECT_STATE_ID
+        )
+    )
+    return version or 0
+
+
+def bump_data_generation(db: Session) -> None:
+    """
+    Record that project data changed, invalidating anything derived from prior generations.
+    """
+    state = get_project_state(db)
+    state.data_generation = ProjectState.data_generation + 1
+    db.flush()
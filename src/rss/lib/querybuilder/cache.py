@@ -0,0 +1,57 @@
+import os
+from typing import Collection, Literal, Optional, Union
+
+from rss.lib.cache import LRUCache
+from rss.lib.catalog import SchemaCatalog
+from rss.lib.project_state import fingerprint
+
+# TODO Move these to a central config object.
+FILTER_CACHE_SIZE = int(os.getenv("FILTER_CACHE_SIZE") or 256)
+# Record sets larger than this are not cached. Cached records are bound into every render,
+# so only sets small enough to be a cheap parameter are worth caching.
+FILTER_CACHE_MAX_RECORDS = int(os.getenv("FILTER_CACHE_MAX_RECORDS") or 2_000)
+
+# Cached record sets are keyed by the data generation and structure version they were
+# computed at, so they are never served once project data or structure changes. Stale
+# entries are simply evicted as the cache fills.
+CacheKey = tuple[int, int, str]
+
+# Besides record sets, the cache marks filters which have been rendered once, and filters
+# which pass too many records to cache.
+FilterCacheMarker = Literal["seen", "uncacheable"]
+
+filter_cache: LRUCache[Union[frozenset[int], FilterCacheMarker]] = LRUCache(
+    FILTER_CACHE_SIZE
+)
+
+
+def filter_cache_key(
+    generation: int,
+    catalog: SchemaCatalog,
+    filters: dict,
+    records: Optional[Collection[int]] = None,
+) -> CacheKey:
+    """
+    A cache key for the records passing some filter dictionary. Filters are normalized, so
+    equivalent dictionaries share a key regardless of their key order. Filters evaluated
+    against a subset of records are keyed by that subset as well.
+    """
+    if records is None:
+        return generation, catalog.version, fingerprint(filters)
+
+    return (
+        generation,
+        catalog.version,
+        fingerprint({"filters": filters, "records": sorted(records)}),
+    )
+
+
+def is_cached(key: CacheKey) -> bool:
+    """
+    Whether the records passing the filter with the provided key are cached.
+    """
+    return isinstance(filter_cache.peek(key), frozenset)
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    return {"filter": filter_cache.stats()}
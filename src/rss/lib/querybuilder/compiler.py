@@ -0,0 +1,243 @@
+from typing import Collection, Generator, Optional, Union
+
+from sqlalchemy import (
+    ColumnElement,
+    CompoundSelect,
+    Select,
+    TextualSelect,
+    exists,
+    intersect,
+    select,
+    union,
+)
+from sqlalchemy.orm import Session
+
+from rss.lib.catalog import SchemaCatalog, get_catalog
+from rss.lib.project_state import data_generation
+from rss.lib.redcap_interface import non_repeating_model
+from .aggregators import Agregator, VALID_AGGREGATORS
+from .cache import FILTER_CACHE_MAX_RECORDS, filter_cache, filter_cache_key
+from .operators import criterion_select, records_clause
+from .planner import order_by_selectivity
+
+# Type definition for criterions list
+criterions = list[dict[str, Union[str, int, bool, None]]]
+
+RecordSelect = Union[Select[tuple[int]], CompoundSelect]
+
+
+def filter_criterions(
+    filters: dict[
+        str,
+        Union[dict, criterions],
+    ]
+) -> Generator[dict[str, Union[str, int, bool, None]], None, None]:
+    """
+    Every criterion within the provided filters, including those of nested filters.
+    """
+    for criterions in filters.values():
+        if isinstance(criterions, dict):
+            yield from filter_criterions(criterions)
+        else:
+            yield from criterions
+
+
+def _combine(
+    operation: Agregator, selects: list[RecordSelect]
+) -> Optional[RecordSelect]:
+    if not selects:
+        return None
+    elif len(selects) == 1:
+        return selects[0]
+    elif operation in ("any", "not"):
+        return union(*selects)
+    else:
+        return intersect(*selects)
+
+
+def _universe(records: Optional[Collection[int]] = None) -> Select[tuple[int]]:
+    model = non_repeating_model()
+    universe = select(model.record_id).distinct()
+
+    if records is not None:
+        universe = universe.where(records_clause(model.record_id, records))
+
+    return universe
+
+
+def _exclude(included: RecordSelect, excluded: RecordSelect) -> Select[tuple[int]]:
+    """
+    The records of `included` which are not in `excluded`, as an anti-join so the excluded
+    records never need to be materialized.
+    """
+    included_records = included.subquery()
+    excluded_records = excluded.subquery()
+
+    return select(included_records.c.record_id).where(
+        ~exists(
+            select(excluded_records.c.record_id).where(
+                excluded_records.c.record_id == included_records.c.record_id
+            )
+        )
+    )
+
+
+def _intersect_by_selectivity(selects: list[Select[tuple[int]]]) -> Select[tuple[int]]:
+    """
+    The records of the first select which pass every other, as semi-joins against it. Later
+    selects are only probed for records passing the first, so when the first passes no records
+    Postgres never has to evaluate the others.
+    """
+    driver = selects[0].subquery()
+
+    return select(driver.c.record_id).where(
+        *(driver.c.record_id.in_(statement) for statement in selects[1:])
+    )
+
+
+def compile_aggregation(
+    db: Session,
+    operation: Agregator,
+    criterions: criterions,
+    catalog: Optional[SchemaCatalog] = None,
+    records: Optional[Collection[int]] = None,
+) -> Optional[RecordSelect]:
+    """
+    Compiles a list of criterions into a single select of record ids, combining the
+    records passing each criterion with the appropriate set operation. `any` aggregations
+    compile to the `UNION` of their criterions, and a `not` aggregation compiles to the
+    `UNION` of the records it excludes.
+
+    Criterions of an `all` aggregation are ordered by the number of records the planner
+    expects each to pass, at the time of compilation. The most selective criterion drives
+    the aggregation, and the others are semi-joined against it, so they are only evaluated
+    for records which still pass.
+
+    Returns `None` if there are no criterions to aggregate, since an empty aggregation
+    places no constraint on the records.
+    """
+    selects = [
+        criterion_select(db, criterion, catalog, records) for criterion in criterions
+    ]
+
+    if operation == "all" and len(selects) > 1:
+        return _intersect_by_selectivity(order_by_selectivity(db, selects))
+
+    return _combine(operation, selects)
+
+
+def compile_filter(
+    db: Session,
+    filters: dict[
+        str,
+        Union[dict, criterions],
+    ],
+    catalog: Optional[SchemaCatalog] = None,
+    records: Optional[Collection[int]] = None,
+) -> Optional[RecordSelect]:
+    """
+    Compiles the provided filters into a single select of the record ids passing them,
+    so that filtering can be done entirely within the database. Filters should be of the
+    form
+    ```
+    filters = {
+        Aggregator: [
+            {"instrument": "instrument", "field": "field", "operator": Operator, "value": <some_value>},
+            criterion2,
+            ...
+        ],
+        Aggregator: {
+            Aggregator: [criterion3, ...],
+        },
+    }
+    ```
+
+    Each aggregation filter within them is intersected with the others. Records passing a
+    `not` aggregation filter are instead excluded from the others via `NOT EXISTS`, or from
+    every record if it has no siblings. If a collection of record ids is provided, each criterion only considers those records.
+
+    Returns `None` if the filters place no constraint on the records.
+    """
+    if catalog is None:
+        catalog = get_catalog(db)
+
+    selects, exclusions = [], []
+    for aggregator, criterions in filters.items():
+        if aggregator not in VALID_AGGREGATORS:
+            raise ValueError(
+                f"Aggregator {aggregator} not in accepted aggregators: {VALID_AGGREGATORS}"
+            )
+
+        # Recurse if the criterions are a filter object dictionary
+        if isinstance(criterions, dict):
+            compiled = compile_filter(db, criterions, catalog, records)
+        else:
+            compiled = compile_aggregation(db, aggregator, criterions, catalog, records)
+
+        if compiled is None:
+            continue
+        elif aggregator == "not":
+            exclusions.append(compiled)
+        else:
+            selects.append(compiled)
+
+    included = _combine("all", selects)
+    excluded = _combine("not", exclusions)
+
+    if excluded is None:
+        return included
+
+    return _exclude(included if included is not None else _universe(records), excluded)
+
+
+def filter_clause(
+    db: Session,
+    record_id: ColumnElement[int],
+    filters: dict[
+        str,
+        Union[dict, criterions],
+    ],
+    records: Optional[Collection[int]] = None,
+    statement: Optional[Union[RecordSelect, TextualSelect]] = None,
+) -> Optional[ColumnElement[bool]]:
+    """
+    Restricts the provided record id column to records passing the provided filters.
+
+    Filters are evaluated within the render query, as a subquery, the first time they are
+    seen at a data generation. Once seen again, the records passing them are fetched and
+    cached if there are few enough, so later renders only compare against a small array of
+    record ids. Filters passing more records are always evaluated as a subquery. If a
+    collection of record ids is provided, it is pushed down into each criterion. A previously
+    compiled filter statement may be provided to avoid compiling the filters.
+
+    Returns `None` if the filters place no constraint on the records.
+    """
+    catalog = get_catalog(db)
+
+    if statement is None:
+        statement = compile_filter(db, filters, catalog, records)
+    if statement is None:
+        return None
+
+    key = filter_cache_key(data_generation(db), catalog, filters, records)
+    cached = filter_cache.get(key)
+
+    if isinstance(cached, frozenset):
+        return records_clause(record_id, cached)
+
+    passing_records = select(statement.subquery().c.record_id)
+
+    # One off filters never pay for a separate fetch of their records.
+    if cached is None:
+        filter_cache.set(key, "seen")
+    elif cached == "seen":
+        fetched = db.scalars(passing_records.limit(FILTER_CACHE_MAX_RECORDS + 1)).all()
+
+        if len(fetched) <= FILTER_CACHE_MAX_RECORDS:
+            passing = frozenset(fetched)
+            filter_cache.set(key, passing)
+            return records_clause(record_id, passing)
+
+        filter_cache.set(key, "uncacheable")
+
+    return record_id.in_(passing_records)
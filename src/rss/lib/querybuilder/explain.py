@@ -0,0 +1,176 @@
+import time
+from typing import Any, Collection, Optional, Union
+
+from sqlalchemy.orm import Session
+
+from rss.lib.catalog import SchemaCatalog, get_catalog
+from rss.lib.project_state import data_generation
+from .aggregators import VALID_AGGREGATORS
+from .cache import filter_cache_key, is_cached
+from .compiler import RecordSelect, compile_aggregation, compile_filter
+from .operators import criterion_select
+from .planner import explain
+
+# Type definition for criterions list
+criterions = list[dict[str, Union[str, int, bool, None]]]
+
+EXPLAIN_OPTIONS = "ANALYZE, BUFFERS, FORMAT JSON"
+
+
+def _explain_statement(
+    db: Session, statement: Optional[RecordSelect]
+) -> dict[str, Any]:
+    """
+    Run the provided statement with instrumentation, returning its SQL, analyzed plan, the
+    rows it returned, and how long it took.
+    """
+    if statement is None:
+        return {
+            "sql": None,
+            "parameters": {},
+            "plan": None,
+            "rows": None,
+            "planned_rows": None,
+            "execution_time": None,
+            "wall_time": None,
+        }
+
+    compiled = statement.compile(
+        dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True}
+    )
+
+    start = time.perf_counter()
+    plan = explain(db, statement, EXPLAIN_OPTIONS)
+    wall_time = time.perf_counter() - start
+
+    return {
+        "sql": str(compiled),
+        "parameters": compiled.params,
+        "plan": plan,
+        "rows": plan[0]["Plan"]["Actual Rows"],
+        "planned_rows": plan[0]["Plan"]["Plan Rows"],
+        "execution_time": plan[0]["Execution Time"],
+        "wall_time": wall_time * 1000,
+    }
+
+
+def _explain_criterion(
+    db: Session,
+    criterion: dict[str, Union[str, int, bool, None]],
+    catalog: SchemaCatalog,
+    records: Optional[Collection[int]],
+) -> dict[str, Any]:
+    explanation = _explain_statement(
+        db, criterion_select(db, criterion, catalog, records)
+    )
+    explanation.update(
+        {
+            "aggregator": None,
+            "criterion": criterion,
+            "cached": None,
+            "children": [],
+        }
+    )
+
+    return explanation
+
+
+def _is_cached(
+    filters: dict[str, Union[dict, criterions]],
+    catalog: SchemaCatalog,
+    generation: int,
+    records: Optional[Collection[int]],
+) -> bool:
+    return is_cached(filter_cache_key(generation, catalog, filters, records))
+
+
+def _explain_aggregation(
+    db: Session,
+    aggregator: str,
+    criterions: criterions,
+    catalog: SchemaCatalog,
+    generation: int,
+    records: Optional[Collection[int]],
+) -> dict[str, Any]:
+    explanation = _explain_statement(
+        db, compile_aggregation(db, aggregator, criterions, catalog, records)  # type: ignore
+    )
+
+    # A `not` aggregation selects the records it excludes, which are the records passing an
+    # `any` filter of the same criterions.
+    equivalent_filter = {"any" if aggregator == "not" else aggregator: criterions}
+
+    explanation.update(
+        {
+            "aggregator": aggregator,
+            "criterion": None,
+            "cached": _is_cached(equivalent_filter, catalog, generation, records),
+            "children": [
+                _explain_criterion(db, criterion, catalog, records)
+                for criterion in criterions
+            ],
+        }
+    )
+
+    return explanation
+
+
+def _explain_filter(
+    db: Session,
+    filters: dict[str, Union[dict, criterions]],
+    catalog: SchemaCatalog,
+    generation: int,
+    records: Optional[Collection[int]],
+    aggregator: Optional[str] = None,
+) -> dict[str, Any]:
+    children = []
+    for child_aggregator, criterions in filters.items():
+        if child_aggregator not in VALID_AGGREGATORS:
+            raise ValueError(
+                f"Aggregator {child_aggregator} not in accepted aggregators: {VALID_AGGREGATORS}"
+            )
+
+        if isinstance(criterions, dict):
+            children.append(
+                _explain_filter(
+                    db, criterions, catalog, generation, records, child_aggregator
+                )
+            )
+        else:
+            children.append(
+                _explain_aggregation(
+                    db, child_aggregator, criterions, catalog, generation, records
+                )
+            )
+
+    explanation = _explain_statement(db, compile_filter(db, filters, catalog, records))
+    explanation.update(
+        {
+            "aggregator": aggregator,
+            "criterion": None,
+            "cached": _is_cached(filters, catalog, generation, records),
+            "children": children,
+        }
+    )
+
+    return explanation
+
+
+def explain_filter(
+    db: Session,
+    filters: dict[str, Union[dict, criterions]],
+    records: Optional[Collection[int]] = None,
+) -> dict[str, Any]:
+    """
+    Run the provided filters through the querybuilder with instrumentation. Returns a tree
+    mirroring the filters, where each filter, aggregation, and criterion node contains the
+    SQL compiled for it, the output of `EXPLAIN (ANALYZE, BUFFERS)`, the number of records
+    it returned, and its execution and wall times in milliseconds. Filter and aggregation
+    nodes report whether the records they select are currently cached, which is the case
+    once an equivalent whole filter was cached by a render. Criterion nodes are never cached.
+
+    Every node is executed, so explaining a filter costs more than evaluating it. Caches are
+    neither read from nor written to.
+    """
+    catalog = get_catalog(db)
+    return _explain_filter(db, filters, catalog, data_generation(db), records)
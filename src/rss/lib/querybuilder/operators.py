@@ -1,17 +1,78 @@
-from typing import Literal, get_args, Union
+from typing import Collection, Literal, Optional, get_args, Union
 
-from sqlalchemy import Boolean, Integer
+from sqlalchemy import (
+    Boolean,
+    ColumnElement,
+    Integer,
+    Numeric,
+    Select,
+    and_,
+    any_,
+    bindparam,
+    func,
+    or_,
+    select,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Session
-from sqlalchemy.orm.query import Query
 
+from rss.lib.catalog import CatalogInstrument, SchemaCatalog, get_catalog
+from rss.lib.redcap_interface import non_repeating_model
 from rss.models.event import Event
+from rss.models.event_record import EventRecord
 from rss.models.instrument import Instrument
-from rss.models.project import ProjectField, ProjectInstrument
 
 # add aggregators/operators here as they become valid
-Operator = Literal["==", "!=", ">=", "<=", ">", "<"]
+Operator = Literal[
+    "==",
+    "!=",
+    ">=",
+    "<=",
+    ">",
+    "<",
+    "in",
+    "not_in",
+    "between",
+    "is_null",
+    "is_not_null",
+    "prefix",
+]
 VALID_OPERATORS: tuple[Operator, ...] = get_args(Operator)
 
+# Operators which compare a field against a list of values, rather than a single value.
+LIST_OPERATORS: tuple[Operator, ...] = ("in", "not_in", "between")
+# Operators which take no value.
+UNARY_OPERATORS: tuple[Operator, ...] = ("is_null", "is_not_null")
+
+# Aggregates a criterion may compare across each record's rows, rather than comparing
+# rows individually.
+Aggregate = Literal["count", "min", "max", "sum"]
+VALID_AGGREGATES: tuple[Aggregate, ...] = get_args(Aggregate)
+
+AGGREGATES = {
+    "count": func.count,
+    "min": func.min,
+    "max": func.max,
+    "sum": func.sum,
+}
+
+# Value types a criterion may compare against. List operators take a list of values sharing
+# one of these types.
+CriterionValue = Union[str, bool, int, None]
+
+
+def _prefix_pattern(prefix: str) -> str:
+    """
+    A `LIKE` pattern matching values beginning with the provided prefix, with wildcards
+    within the prefix escaped by `/`. The whole pattern is bound as one parameter, so it
+    can be matched against `text_pattern_ops` indexes.
+    """
+    escaped = prefix.replace("/", "//").replace("%", "/%").replace("_", "/_")
+    return f"{escaped}%"
+
+
+# REDCap exports missing values as empty strings, so those are treated as null alongside
+# fields which are absent from a data blob entirely.
 OPERATORS = {
     "==": lambda model_field, field_value: model_field == field_value,
     "!=": lambda model_field, field_value: model_field != field_value,
@@ -19,6 +80,16 @@ OPERATORS = {
     "<=": lambda model_field, field_value: model_field <= field_value,
     "<": lambda model_field, field_value: model_field < field_value,
     ">": lambda model_field, field_value: model_field > field_value,
+    "in": lambda model_field, field_value: model_field.in_(field_value),
+    "not_in": lambda model_field, field_value: model_field.not_in(field_value),
+    "between": lambda model_field, field_value: model_field.between(*field_value),
+    "is_null": lambda model_field, _: or_(model_field.is_(None), model_field == ""),
+    "is_not_null": lambda model_field, _: and_(
+        model_field.is_not(None), model_field != ""
+    ),
+    "prefix": lambda model_field, field_value: model_field.like(
+        _prefix_pattern(field_value), escape="/"
+    ),
 }
 
 
@@ -39,33 +110,61 @@ def _extract_path(path: str) -> tuple[str, str]:
 
 
 def _induce_model(
-    field_relationships: Query[ProjectInstrument], field_name: str
-) -> Union[type[Event], type[Instrument]]:
+    catalog: SchemaCatalog, field_name: str
+) -> Union[type[Event], type[Instrument], type[EventRecord]]:
     """
     Induce which model a provided field belongs to based on whether the instrument
     it is associated with is repeatable.
 
     - A field will appear in some data object of the `Event` model when the instrument
-      the field belongs to is not repeatable.
+      the field belongs to is not repeatable (or of the `EventRecord` model, when the
+      consolidated storage layout is in use).
     - A field will appear in some data object of the `Instrument` model when the
       instrument  the field belongs to is repeatable.
     """
-    is_event = (
-        not field_relationships.filter(ProjectField.name == field_name).one().repeating
-    )
-    return Event if is_event else Instrument
+    is_event = not catalog.field_instrument(field_name).repeating
+    return non_repeating_model() if is_event else Instrument
 
 
-def compare(
-    db: Session,
-    operator: str,
-    instrument: ProjectInstrument,
-    field: str,
-    field_value: Union[str, bool, int, None],
-    model: Union[type[Event], type[Instrument]],
+def criterion_model(
+    catalog: SchemaCatalog, instrument: CatalogInstrument, field: Optional[str]
+) -> Union[type[Event], type[Instrument], type[EventRecord]]:
+    """
+    The model a criterion on the provided instrument and field is evaluated against. Criterions
+    without a field (such as counts of instrument rows) use the model of their instrument.
+    """
+    if field is None:
+        return Instrument if instrument.repeating else non_repeating_model()
+
+    return _induce_model(catalog, field)
+
+
+def _instrument_scope(
+    model: Union[type[Event], type[Instrument], type[EventRecord]],
+    instrument: CatalogInstrument,
 ):
-    # Our goal is to find all record_id / event pairs that contain a field that passes
-    # the provided criterion.
+    """
+    Restrict rows of the provided model to those containing data from the provided
+    instrument. Consolidated rows are not associated with an instrument directly, so
+    they are instead restricted to the events the instrument belongs to.
+    """
+    if model is EventRecord:
+        return model.event_id.in_(instrument.event_ids)
+
+    return model.instrument_id == instrument.id
+
+
+def records_clause(
+    record_id: ColumnElement[int], records: Collection[int]
+) -> ColumnElement[bool]:
+    """
+    Restrict the provided record id column to the provided records. Records are bound as a
+    single array parameter, so large record sets do not produce enormous statements.
+    """
+    return record_id == any_(bindparam(None, sorted(records), type_=ARRAY(Integer)))
+
+
+def _comparison(operator: Optional[str]):
     if operator is None:
         raise ValueError(
             f"Criterion dictionary must contain a valid operator, not `None`: {VALID_OPERATORS}"
@@ -74,58 +173,137 @@ def compare(
         raise ValueError(
             f"Operator {operator} not in accepted operators: {VALID_OPERATORS}"
         )
-    else:
-        comparison = OPERATORS[operator]
+
+    return OPERATORS[operator]
+
+
+def _sample_value(
+    operator: str, field_value: Union[CriterionValue, list[CriterionValue]]
+) -> CriterionValue:
+    """
+    Validate the value passed to the provided operator, returning a value whose type
+    determines how the compared field should be cast.
+    """
+    if operator in UNARY_OPERATORS:
+        return None
+    elif operator in LIST_OPERATORS:
+        if not isinstance(field_value, list):
+            raise ValueError(f"Operator {operator} requires a list of values.")
+        elif operator == "between" and len(field_value) != 2:
+            raise ValueError(
+                "Operator between requires a list of two values: `[lower, upper]`."
+            )
+
+        # Values are cast based on the type of the first value within the list.
+        return field_value[0] if field_value else None
+    elif operator == "prefix" and not isinstance(field_value, str):
+        raise ValueError("Operator prefix requires a string value.")
+
+    return field_value  # type: ignore
+
+
+def comparison_cast(
+    operator: str, field_value: Union[CriterionValue, list[CriterionValue]]
+) -> Optional[type[Union[Boolean, Integer]]]:
+    """
+    The type a field is cast to before being compared against the provided value, or `None`
+    if the field is compared as text.
+    """
+    sample = _sample_value(operator, field_value)
+
+    if isinstance(sample, bool):
+        return Boolean
+    elif isinstance(sample, int):
+        return Integer
+
+    return None
+
+
+def comparison_clause(
+    operator: str,
+    field: str,
+    field_value: Union[CriterionValue, list[CriterionValue]],
+    model: Union[type[Event], type[Instrument], type[EventRecord]],
+):
+    """
+    Construct the SQL expression comparing the provided field of the model's data blob
+    against the provided value. List operators expect a list of values of a single type,
+    and `between` expects a list of exactly two values: `[lower, upper]`. The value of
+    unary operators is ignored.
+    """
+    comparison = _comparison(operator)
+    cast = comparison_cast(operator, field_value)
 
     # TODO: Worried about boolean and integer casts when data is missing, as we will have
     #       Integer("") or Bool(""). The latter is falsy, but the former may evaluate to
     #       some undesirable number or raise an error.
-    if isinstance(field_value, bool):
-        results = (
-            db.query(model.record_id)
-            .filter(
-                model.instrument_id == instrument.id,
-                comparison(model.data[field].astext.cast(Boolean), field_value),
-            )
-            .distinct()
-            .tuples()
-            .all()
-        )
-    elif isinstance(field_value, int):
-        results = (
-            db.query(model.record_id)
-            .filter(
-                model.instrument_id == instrument.id,
-                comparison(model.data[field].astext.cast(Integer), field_value),
-            )
-            .distinct()
-            .tuples()
-            .all()
+    model_field = model.data[field].astext
+    if cast is not None:
+        return comparison(model_field.cast(cast), field_value)
+
+    return comparison(model_field, field_value)
+
+
+def aggregate_clause(
+    aggregate: str,
+    operator: str,
+    field: Optional[str],
+    field_value: Union[CriterionValue, list[CriterionValue]],
+    model: Union[type[Event], type[Instrument], type[EventRecord]],
+):
+    """
+    Construct the SQL expression comparing an aggregate of the provided field across each
+    record's rows against the provided value, for use in a `HAVING` clause. `count` counts
+    rows with a value for the field, or every row if no field is provided. `min` and `max`
+    compare numerically when the value is a number and lexically otherwise, while `sum` is
+    always numeric. Empty values are ignored by every aggregate.
+    """
+    if aggregate not in VALID_AGGREGATES:
+        raise ValueError(
+            f"Aggregate {aggregate} not in accepted aggregates: {VALID_AGGREGATES}"
         )
-    else:
-        results = (
-            db.query(model.record_id)
-            .filter(
-                model.instrument_id == instrument.id,
-                comparison(model.data[field].astext, field_value),
-            )
-            .distinct()
-            .tuples()
-            .all()
+    elif operator in UNARY_OPERATORS or operator == "prefix":
+        raise ValueError(
+            f"Operator {operator} can not be used to compare an aggregate value."
         )
 
-    return results
+    comparison = _comparison(operator)
+    sample = _sample_value(operator, field_value)
+
+    if field is None and aggregate == "count":
+        return comparison(func.count(), field_value)
+    elif field is None:
+        raise ValueError(f"Aggregate {aggregate} requires a field to aggregate.")
+
+    value = func.nullif(model.data[field].astext, "")
+    if aggregate == "count":
+        return comparison(func.count(value), field_value)
+    elif aggregate == "sum" or (
+        isinstance(sample, (int, float)) and not isinstance(sample, bool)
+    ):
+        value = value.cast(Numeric)
 
+    return comparison(AGGREGATES[aggregate](value), field_value)
 
-def evaluate_criterion(
-    db: Session, criterion: dict[str, Union[str, bool, int, None]]
-) -> list[tuple[int]]:
+
+def criterion_select(
+    db: Session,
+    criterion: dict[str, Union[str, bool, int, None]],
+    catalog: Optional[SchemaCatalog] = None,
+    candidates: Optional[Collection[int]] = None,
+) -> Select[tuple[int]]:
     """
-    Evaluate a criterion dictionary against the database, returning any records
-    from the db that pass the filter defined by the criterion dictionary.
+    Construct a select of the distinct record ids from the db that pass the filter
+    defined by the criterion dictionary. Instrument and field names are resolved via
+    the provided schema catalog, or the process-wide catalog if none is provided.
 
-    criterion:
+    Criterions may include an `aggregate` (one of `VALID_AGGREGATES`), in which case the
+    operator compares the aggregated value of the field across each record's rows:
+    ```
+    {"instrument": "labs", "field": "value", "aggregate": "max", "operator": ">", "value": 10}
+    ```
 
+    If a collection of candidate record ids is provided, only those records are considered.
     """
     # Fetch and validate instrument type
     instrument = criterion.get("instrument")
@@ -138,13 +316,20 @@ def evaluate_criterion(
             "The `instrument` field in a criterion dictionary should be a string."
         )
 
-    # Fetch and validate field type
+    # Fetch and validate aggregate type
+    aggregate = criterion.get("aggregate")
+    if aggregate is not None and not isinstance(aggregate, str):
+        raise ValueError(
+            "The `aggregate` field in a criterion dictionary should be a string."
+        )
+
+    # Fetch and validate field type. Counts may omit the field to count every row.
     field = criterion.get("field")
-    if field is None:
+    if field is None and aggregate != "count":
         raise ValueError(
             "The `field` field in a criterion dictionary is required, and can not be `None`"
         )
-    elif not isinstance(field, str):
+    elif field is not None and not isinstance(field, str):
         raise ValueError(
             "The `field` field in a criterion dictionary should be a string."
         )
@@ -160,24 +345,42 @@ def evaluate_criterion(
             "The `operator` field in a criterion dictionary should be a string."
         )
 
-    # Fetch the instrument object to which the requested field belongs
-    instrument = (
-        db.query(ProjectInstrument).filter(ProjectInstrument.name == instrument).one()
-    )
+    if catalog is None:
+        catalog = get_catalog(db)
+
+    # Resolve the instrument object to which the requested field belongs
+    instrument = catalog.instrument(instrument)
 
     # TODO: Ensure this properly handles all desired types, including None types
     field_value = criterion.get("value")
 
-    fields = db.query(ProjectInstrument).join(ProjectField)
-    model = _induce_model(fields, field)
+    model = criterion_model(catalog, instrument, field)
+
+    # Aggregate criterions compare values across all of a record's rows (such as each repeat
+    # instance of an instrument), so rows are grouped by record. Records without any rows
+    # never pass an aggregate criterion.
+    if aggregate is not None:
+        criterion_query = (
+            select(model.record_id)
+            .where(_instrument_scope(model, instrument))
+            .group_by(model.record_id)
+            .having(
+                aggregate_clause(aggregate, field_operator, field, field_value, model)
+            )
+        )
+    else:
+        criterion_query = (
+            select(model.record_id)
+            .where(
+                _instrument_scope(model, instrument),
+                comparison_clause(field_operator, field, field_value, model),
+            )
+            .distinct()
+        )
 
-    results = compare(
-        db=db,
-        operator=field_operator,
-        instrument=instrument,
-        field=field,
-        field_value=field_value,
-        model=model,
-    )
+    if candidates is not None:
+        criterion_query = criterion_query.where(
+            records_clause(model.record_id, candidates)
+        )
 
-    return [(row[0],) for row in results]
+    return criterion_query
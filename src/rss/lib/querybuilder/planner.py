@@ -0,0 +1,55 @@
+import logging
+from typing import Any, Union
+
+from sqlalchemy import CompoundSelect, Select
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+def explain(
+    db: Session,
+    statement: Union[Select, CompoundSelect],
+    options: str = "FORMAT JSON",
+) -> Any:
+    """
+    Explain the provided statement with the provided `EXPLAIN` options. The statement is only
+    executed if the options include `ANALYZE`.
+    """
+    connection = db.connection()
+    compiled = statement.compile(
+        dialect=connection.dialect, compile_kwargs={"render_postcompile": True}
+    )
+
+    return connection.exec_driver_sql(
+        f"EXPLAIN ({options}) {compiled}", compiled.params
+    ).scalar_one()
+
+
+def estimate_rows(db: Session, statement: Select) -> float:
+    """
+    The number of rows the planner expects the provided statement to return. The statement is
+    only planned, not executed.
+    """
+    return explain(db, statement)[0]["Plan"]["Plan Rows"]
+
+
+def order_by_selectivity(
+    db: Session, selects: list[Select[tuple[int]]]
+) -> list[Select[tuple[int]]]:
+    """
+    Orders selects of record ids so those the planner expects to return the fewest records
+    come first. Selects are only planned, not executed.
+    """
+    if len(selects) < 2:
+        return selects
+
+    estimates = [estimate_rows(db, statement) for statement in selects]
+
+    logger.debug(f"Estimated criterion selectivity: {estimates}.")
+    return [
+        statement
+        for _, statement in sorted(
+            zip(estimates, selects), key=lambda estimate: estimate[0]
+        )
+    ]
@@ -8,8 +8,15 @@ from sqlalchemy.orm import Session
 from sqlalchemy.dialects.postgresql import insert
 
 from redcap.project import Project
+from rss.lib.project_state import (
+    bump_data_generation,
+    changed_structure_elements,
+    fingerprint_project_structure,
+    record_structure_change,
+)
 from rss.models.project import ProjectArm, ProjectEvent, ProjectInstrument, ProjectField
 from rss.models.event import Event
+from rss.models.event_record import EventRecord
 from rss.models.instrument import Instrument
 
 logger = logging.getLogger(__name__)
@@ -20,6 +27,13 @@ class RecordClass(Enum):
     FORM = "instrument"
 
 
+class StorageLayout(Enum):
+    # One `Event` row per (record, event, instrument).
+    INSTRUMENT = "instrument"
+    # One `EventRecord` row per (record, event), merging all non-repeating instruments.
+    CONSOLIDATED = "consolidated"
+
+
 def redcap_environment() -> tuple[str, str]:
     redcap_url = os.environ.get("REDCAP_URL")
     redcap_api_key = os.environ.get("REDCAP_API_KEY")
@@ -35,13 +49,44 @@ def redcap_environment() -> tuple[str, str]:
     return redcap_url, redcap_api_key
 
 
-def build_event_map(redcap_project: Project) -> dict[str, dict[str, list[str]]]:
+def storage_layout() -> StorageLayout:
+    """
+    The layout non-repeating REDCap data is stored in. Defaults to one row per instrument,
+    but may be set to `consolidated` via the `EVENT_STORAGE_LAYOUT` environment variable.
+    """
+    layout = os.environ.get("EVENT_STORAGE_LAYOUT") or StorageLayout.INSTRUMENT.value
+
+    try:
+        return StorageLayout(layout)
+    except ValueError:
+        raise ValueError(
+            f"`EVENT_STORAGE_LAYOUT` should be one of {[layout.value for layout in StorageLayout]}, not {layout}."
+        )
+
+
+def non_repeating_model() -> Union[type[Event], type[EventRecord]]:
     """
-    Construct a map of events and which study arm they belong to.
+    The model non-repeating REDCap data is stored within under the current storage layout.
+    """
+    if storage_layout() == StorageLayout.CONSOLIDATED:
+        return EventRecord
+
+    return Event
+
+
+def build_event_map(
+    redcap_project: Project, event_mappings: Optional[list[dict[str, str]]] = None
+) -> dict[str, dict[str, list[str]]]:
+    """
+    Construct a map of events and which study arm they belong to. Instrument event
+    mappings are exported from the project unless already exported mappings are provided.
     """
     event_map = {}
 
-    for event_dict in redcap_project.export_instrument_event_mappings():
+    if event_mappings is None:
+        event_mappings = redcap_project.export_instrument_event_mappings()
+
+    for event_dict in event_mappings:
         event = event_dict.get("unique_event_name")
         arm = event_dict.get("arm_num")
         form = event_dict.get("form")
@@ -83,13 +128,20 @@ def build_form_field_map(
     return form_field_map
 
 
-def build_repeat_instruments_map(redcap_project: Project) -> dict[str, str]:
+def build_repeat_instruments_map(
+    redcap_project: Project,
+    repeating_instruments: Optional[list[dict[str, str]]] = None,
+) -> dict[str, str]:
     """
-    Construct a map of repeat instruments and which events they belong to.
+    Construct a map of repeat instruments and which events they belong to. Repeating
+    instruments are exported from the project unless an existing export is provided.
     """
     repeat_instrument_map = {}
 
-    for instrument in redcap_project.export_repeating_instruments_events():
+    if repeating_instruments is None:
+        repeating_instruments = redcap_project.export_repeating_instruments_events()
+
+    for instrument in repeating_instruments:
         event = instrument.get("event_name")
         form = instrument.get("form_name")
 
@@ -136,14 +188,19 @@ def export_records_in_batch(
 def upsert_record_data(
     db: Session,
     records_to_upsert: list[dict],
-    Model: Union[type[Event], type[Instrument]],
+    Model: Union[type[Event], type[Instrument], type[EventRecord]],
     constraint: str,
 ) -> int:
     """
     Upserts the provided REDCap records into the passed db session. The passed model
     is the model object these records belong to while the constraint is the PSQL
     UNIQUE CONSTRAINT that tells us when records conflict with those within our DB.
+
+    Consolidated `EventRecord` rows are not associated with a single instrument, so the
+    form name of records upserted into that model is ignored.
     """
+    consolidated = Model is EventRecord
+
     logger.info(
         f"Preparing to upsert {len(records_to_upsert)} {Model.__name__} records."
     )
@@ -160,7 +217,7 @@ def upsert_record_data(
                 select(ProjectEvent).where(ProjectEvent.name == record["event_name"])
             ).one_or_none()
 
-        if record["form_name"] not in fetched_instruments:
+        if not consolidated and record["form_name"] not in fetched_instruments:
             logger.debug(
                 f"No cached instrument found. Fetching event info for {record['event_name']}."
             )
@@ -171,10 +228,7 @@ def upsert_record_data(
                 )
             ).one_or_none()
 
-        event, instrument = (
-            fetched_events[record["event_name"]],
-            fetched_instruments[record["form_name"]],
-        )
+        event = fetched_events[record["event_name"]]
 
         # The event/instrument this record belongs to must exist on our DB instance to ingest it.
         if not event:
@@ -182,22 +236,27 @@ def upsert_record_data(
                 f"Event name {record['event_name']} does not exist on this project."
             )
 
-        if not instrument:
-            raise ValueError(
-                f"Instrument name {record['form_name']} does not exist on this project."
-            )
-
         item = {
             "record_id": record["record_id"],
             "repeat_instance": record["repeat_instance"],
             "data": record["data"],
             "event_id": event.id,
-            "instrument_id": instrument.id,
         }
+
+        if not consolidated:
+            instrument = fetched_instruments[record["form_name"]]
+
+            if not instrument:
+                raise ValueError(
+                    f"Instrument name {record['form_name']} does not exist on this project."
+                )
+
+            item["instrument_id"] = instrument.id
+
         items.append(item)
 
         logger.debug(
-            f"Adding event from record {item['record_id']} within event {item['event_id']}, instrument {item['instrument_id']} (repeat instance {item['repeat_instance']})."
+            f"Adding event from record {item['record_id']} within event {item['event_id']}, instrument {item.get('instrument_id')} (repeat instance {item['repeat_instance']})."
         )
 
     # Bulk upsert all items in batches of 5000 to avoid EOF errors due to buffer size.
@@ -214,15 +273,32 @@ def upsert_record_data(
                 f"Upserted {len(batch)} (batch {n+1}) records of type {Model.__name__}. {result.rowcount} conflicting records were updated."
             )
 
-        db.flush()
+        bump_data_generation(db)
 
     return len(items)
 
 
-def relational_redcap(redcap_project: Project, db: Session) -> None:
+def export_project_structure(redcap_project: Project) -> dict[str, list[dict]]:
+    """
+    Export each element of the REDCap project structure the relational project is built from.
+    """
+    return {
+        "metadata": redcap_project.metadata,
+        "event_mappings": redcap_project.export_instrument_event_mappings(),
+        "repeating_instruments": redcap_project.export_repeating_instruments_events(),
+        "field_names": redcap_project.export_field_names(),
+    }
+
+
+def relational_redcap(redcap_project: Project, db: Session) -> bool:
     """
     Adds rows representing the passed REDCap project relationally to
     the passed db session.
+
+    The exported project structure is fingerprinted and compared to the structure the
+    relational project was last synced from. When nothing has changed, the sync is skipped
+    entirely. Otherwise, only the parts of the relational project built from changed
+    elements are synced. Returns whether the project structure changed.
     """
 
     def add_arm_to_project(arm: str) -> ProjectArm:
@@ -280,6 +356,7 @@ def relational_redcap(redcap_project: Project, db: Session) -> None:
                 )
             else:
                 project_event = existing_event
+                project_event.repeating = repeating_event
                 logger.debug(
                     f"Event {project_event.name} of type Repeating = {repeating_event} already existed in project."
                 )
@@ -298,7 +375,6 @@ def relational_redcap(redcap_project: Project, db: Session) -> None:
         instruments: list[str],
         created_instruments: dict[str, ProjectInstrument],
     ) -> dict[str, ProjectInstrument]:
-
         logger.debug(
             f"Adding {len(instruments)} within {project_event.name} to project."
         )
@@ -331,6 +407,9 @@ def relational_redcap(redcap_project: Project, db: Session) -> None:
 
                 # this object is persistent
                 db.refresh(project_instrument)
+
+                # Instruments may start or stop repeating after they were created.
+                project_instrument.repeating = repeating_instrument
                 logger.debug(
                     f"Instrument {project_instrument} of type Repeating = {repeating_instrument} has already been created in the past. Added event relationship to {project_event.name}."
                 )
@@ -353,6 +432,7 @@ def relational_redcap(redcap_project: Project, db: Session) -> None:
         field: dict,
         created_instruments: dict[str, ProjectInstrument],
         instrument_fields: Union[dict[str, str], dict[str, list[str]]],
+        field_metadata: dict[str, dict[str, str]],
     ):
         instrument_name = instrument_fields.get(field["original_field_name"])
 
@@ -396,9 +476,16 @@ def relational_redcap(redcap_project: Project, db: Session) -> None:
             select(ProjectField).where(ProjectField.name == field_name)
         ).one_or_none()
 
+        # Fields not surfaced by the data dictionary (such as <survey_name>_complete) are untyped.
+        metadata = field_metadata.get(field["original_field_name"], {})
+        field_type = metadata.get("field_type") or None
+        validation = metadata.get("text_validation_type_or_show_slider_number") or None
+
         if not existing_field:
             project_field = ProjectField(
                 name=field_name,
+                field_type=field_type,
+                validation=validation,
                 instrument_id=existing_instrument.id,
                 instrument=existing_instrument,
             )
@@ -408,36 +495,66 @@ def relational_redcap(redcap_project: Project, db: Session) -> None:
             )
         else:
             project_field = existing_field
+            project_field.field_type = field_type
+            project_field.validation = validation
             logger.debug(
                 f"Field {project_field.name} within instrument {existing_instrument.name} already existed in project."
             )
 
         return project_field
 
+    structure = export_project_structure(redcap_project)
+    repeating_instruments = build_repeat_instruments_map(
+        redcap_project, structure["repeating_instruments"]
+    )
+
+    # Repeating instruments are fingerprinted as the map the `repeating` flags of events
+    # and instruments are derived from, so any change to those flags triggers a sync.
+    structure_fingerprint = fingerprint_project_structure(
+        {**structure, "repeating_instruments": repeating_instruments}
+    )
+    changed_elements = changed_structure_elements(db, structure_fingerprint)
+
+    if not changed_elements:
+        logger.info("REDCap project structure is unchanged. Skipping structure sync.")
+        return False
+
+    logger.info(f"REDCap project structure elements {changed_elements} changed.")
+
     # Dictionary persists instruments created during this functions' execution since they will not yet be available within the DB.
     created_instruments: dict[str, ProjectInstrument] = {}
 
-    arm_event_instruments = build_event_map(redcap_project)
-    repeating_instruments = build_repeat_instruments_map(redcap_project)
-
-    logger.debug(f"Adding {len(arm_event_instruments)} arms to project.")
-    for arm, instruments_within_arm in arm_event_instruments.items():
-        project_arm = add_arm_to_project(arm)
-        created_instruments = {
-            **created_instruments,
-            **add_all_events_to_arm(
-                project_arm, instruments_within_arm, repeating_instruments
-            ),
-        }
+    arm_event_instruments = build_event_map(redcap_project, structure["event_mappings"])
+
+    # Arms, events, and instruments are built from event mappings and repeating instruments.
+    if changed_elements & {"event_mappings", "repeating_instruments"}:
+        logger.debug(f"Adding {len(arm_event_instruments)} arms to project.")
+        for arm, instruments_within_arm in arm_event_instruments.items():
+            project_arm = add_arm_to_project(arm)
+            created_instruments = {
+                **created_instruments,
+                **add_all_events_to_arm(
+                    project_arm, instruments_within_arm, repeating_instruments
+                ),
+            }
 
-    instrument_fields = build_form_field_map(redcap_project, reverse_mapping=True)
-    field_names = redcap_project.export_field_names()
+    # Fields are built from the data dictionary and export field names. Newly created
+    # instruments have not had their fields added yet either.
+    if created_instruments or changed_elements & {"metadata", "field_names"}:
+        instrument_fields = build_form_field_map(redcap_project, reverse_mapping=True)
+        field_metadata = {field["field_name"]: field for field in structure["metadata"]}
+        field_names = structure["field_names"]
+
+        logger.debug(f"Adding {len(field_names)} fields to project.")
+        for field in field_names:
+            add_field_to_project(
+                field, created_instruments, instrument_fields, field_metadata
+            )
 
-    logger.debug(f"Adding {len(field_names)} fields to project.")
-    for field in field_names:
-        add_field_to_project(field, created_instruments, instrument_fields)
+    record_structure_change(db, structure_fingerprint)
 
     logger.info("Done constructing relational representation of REDCap project.")
+    return True
 
 
 def relational_refresh(
@@ -446,8 +563,12 @@ def relational_refresh(
     """
     Refreshes all events in the provided REDCap project. Record export will be done
     using the provided batch size, if provided.
+
+    When the consolidated storage layout is in use, all non-repeating instruments within
+    an event are exported together and merged into a single `EventRecord` row per record.
     """
     events_to_refresh = db.scalars(select(ProjectEvent)).all()
+    consolidated = storage_layout() == StorageLayout.CONSOLIDATED
     refreshed_events = 0
 
     if batch_size:
@@ -464,7 +585,25 @@ def relational_refresh(
         logger.debug(
             f"Refreshing {len(event.instruments)} instruments within event {event}."
         )
-        for instrument in event.instruments:
+        instruments_to_refresh = event.instruments
+
+        if consolidated:
+            instruments_to_refresh = [
+                instrument for instrument in event.instruments if instrument.repeating
+            ]
+            refreshed_events += refresh_consolidated_event(
+                redcap_project,
+                db,
+                event,
+                [
+                    instrument.name
+                    for instrument in event.instruments
+                    if not instrument.repeating
+                ],
+                batches,
+            )
+
+        for instrument in instruments_to_refresh:
             logger.info(f"Working on {event.name}, {instrument.name}")
             for record_batch in export_records_in_batch(
                 redcap_project, batches, events=[event.name], forms=[instrument.name]
@@ -499,6 +638,42 @@ def relational_refresh(
     logger.info(f"Successfully refreshed {refreshed_events}.")
 
 
+def refresh_consolidated_event(
+    redcap_project: Project,
+    db: Session,
+    event: ProjectEvent,
+    instruments: list[str],
+    batches: Optional[list[tuple[int]]] = None,
+) -> int:
+    """
+    Refreshes all provided non-repeating instruments within an event at once, merging them
+    into a single consolidated `EventRecord` row per record.
+    """
+    if not instruments:
+        return 0
+
+    logger.info(f"Working on {event.name}, {len(instruments)} consolidated instruments")
+
+    refreshed_events = 0
+    for record_batch in export_records_in_batch(
+        redcap_project, batches, events=[event.name], forms=instruments
+    ):
+        logger.debug(f"Reformatting {len(record_batch)} prior to upsert.")
+        refreshed_records = [
+            format_redcap_record(redcap_project, record, event.name, instruments[0])
+            for record in record_batch
+        ]
+
+        refreshed_events += upsert_record_data(
+            db,
+            refreshed_records,
+            EventRecord,
+            "event_record_record_id_repeat_instance_event_id_key",
+        )
+
+    return refreshed_events
+
+
 def format_redcap_record(
     project: Project, record: dict[str, str], event_name: str, form_name: str
 ) -> dict[str, Union[str, dict[str, str]]]:
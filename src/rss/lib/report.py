@@ -1,35 +1,45 @@
-from sqlalchemy import tuple_, any_, select, Select
+from sqlalchemy import FromClause, func, literal_column, select, Select, true
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array
 from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.sql.elements import ColumnElement
 
-from typing import Union, Callable
+from typing import Any, Callable, Hashable, Optional, Union
 
 from rss import deps
+from rss.lib.catalog import get_catalog
 from rss.lib.exceptions.report import NoCustomCalculatorError
-from rss.lib.querybuilder.filter import filter
+from rss.lib.project_state import fingerprint
+from rss.lib.querybuilder.cache import filter_cache_key
+from rss.lib.querybuilder.compiler import filter_clause
+from rss.lib.report_plan import current_report_plan, filter_statement
 from rss.models.event import Event
+from rss.models.event_record import EventRecord
 from rss.models.instrument import Instrument
-from rss.models.project import ProjectEvent, ProjectInstrument, ProjectField
+from rss.models.project import ProjectEvent, ProjectInstrument
 from rss.models.report import Report
-from rss.view_models import event, instrument
+from rss.view_models import event, event_record, instrument
 
 
 def construct_report_select(
     db: Session,
     report: Report,
-    model: type[Union[Event, Instrument]],
-    field_calculator: Callable[
-        [
-            Session,
-            Select[tuple[Union[Instrument, Event]]],
-            list[str],
-            deps.PaginatedParams,
-        ],
-        list[Union[instrument.Instrument, event.Event]],
+    model: type[Union[Event, Instrument, EventRecord]],
+    field_calculator: Optional[
+        Callable[
+            [
+                Session,
+                Select[tuple[Union[Instrument, Event, EventRecord]]],
+                list[str],
+                deps.PaginatedParams,
+            ],
+            list[Union[instrument.Instrument, event.Event, event_record.EventRecord]],
+        ]
     ],
-    page_params: deps.PaginatedParams,
+    page_params: Optional[deps.PaginatedParams],
+    calculate_fields: bool = True,
 ) -> tuple[
-    Select[tuple[Union[Event, Instrument]]],
-    list[Union[instrument.Instrument, event.Event]],
+    Select[tuple[Union[Event, Instrument, EventRecord]]],
+    list[Union[instrument.Instrument, event.Event, event_record.EventRecord]],
 ]:
     # subqueryload and selectinload have similar performance, and both are improvements over a
     # joinedload. Both are better than lazy loading in this scenario, since we are guaranteed to
@@ -38,47 +48,62 @@ def construct_report_select(
     # See: https://docs.sqlalchemy.org/en/13/orm/loading_relationships.html#select-in-loading
     report_query = select(model).options(selectinload("*"))
 
-    # TODO: Can we do this later so that the filter function can do less work? (probably not)
-    if report.filters:
-        matching_rows = [(row[0],) for row in filter(db, report.filters)]
+    # Subset by filtered record_ids up front to ease burden on future queries. Our
+    # goal here isn't to prune the data fields into what the user wants, but rather
+    # to only surface records that match user provided filters. Filters are compiled
+    # into a single statement when the report is saved, and the records passing them are
+    # cached between renders.
+    plan = current_report_plan(db, report)
+    compiled_filter = filter_statement(plan)
 
-        # Subset by filtered record_ids up front to ease burden on future queries. Our
-        # goal here isn't to prune the data fields into what the user wants, but rather
-        # to only surface records that match user provided filters.
-        report_query = report_query.where(
-            tuple_(model.record_id) == (any_(matching_rows))  # type: ignore
+    if compiled_filter is not None:
+        matching_records = filter_clause(
+            db,
+            model.record_id,
+            report.filters,
+            report.records or None,
+            compiled_filter,
         )
 
+        if matching_records is not None:
+            report_query = report_query.where(matching_records)
+
     # Filter by user requested records
     if report.records:
         report_query = report_query.where(model.record_id.in_(report.records))
 
-    # TODO: If a lower level filter is applied, we need to perform joins for the higher
-    #       level fields as well. If only a higher level field is applied, we can stop
-    #       at that field.
-    if any([report.events, report.instruments, report.fields]):
-        report_query = (
-            report_query.join(ProjectEvent, onclause=ProjectEvent.id == model.event_id)
-            .join(
-                ProjectInstrument,
-                onclause=ProjectInstrument.id == model.instrument_id,
-            )
-            .join(ProjectField)
+    # Consolidated rows are not associated with a single instrument, so instrument and field
+    # scoping is done via the events those instruments belong to.
+    if model is EventRecord:
+        return _construct_consolidated_report_select(
+            db,
+            report,
+            plan,
+            report_query,
+            field_calculator if calculate_fields else None,
+            page_params,
         )
 
-    # Filter by user requested instruments, events, and fields.
+    # Filter by user requested events and instruments. Names are resolved to ids in the report
+    # plan, so rows are scoped without joining the project structure tables, which would
+    # multiply each row by the number of fields on its instrument.
     if report.events:
-        report_query = report_query.where(ProjectEvent.name.in_(report.events))
+        report_query = report_query.where(model.event_id.in_(plan["event_ids"]))
 
     if report.instruments:
         report_query = report_query.where(
-            ProjectInstrument.name.in_(report.instruments)
+            model.instrument_id.in_(plan["instrument_ids"])  # type: ignore
         )
 
-    # TODO: This method of calculating report data on paginated queries might have the result of
-    #       calculating the same data twice if some events are within one batch and some are within
-    #       another. We should paginated via record_ids, rather than pk ids/rows.
-    if report.calculated_instrument_fields and field_calculator is None:
+    # NOTE: Row aligned pages may split the rows of a record across pages, in which case data
+    #       calculated per record may be calculated once per page. Pages requested with
+    #       `align=record` contain every row of their records, so calculators should paginate
+    #       over record ids when `page_params.align` is `PageAlignment.RECORD`.
+    # Calculated fields are computed per page, so they may be skipped by callers which
+    # do not render pages, such as exports, which pass no page parameters.
+    if not calculate_fields or page_params is None:
+        calculated_report_data = []
+    elif report.calculated_instrument_fields and field_calculator is None:
         raise NoCustomCalculatorError(
             "Calculated instrument fields are defined on this report, but no field calculator was provided."
         )
@@ -96,14 +121,317 @@ def construct_report_select(
     else:
         calculated_report_data = []
 
+    # Rows are scoped to the instruments of the requested fields. Data is projected to the
+    # requested fields when the report is rendered.
     if report.fields:
-        report_query = report_query.where(ProjectField.name.in_(report.fields))
+        report_query = report_query.where(
+            model.instrument_id.in_(plan["field_instrument_ids"])  # type: ignore
+        )
 
     return report_query, calculated_report_data
 
 
-def filter_item_fields(item_fields: list[str], response_data: dict):
-    for row in response_data["items"]:
-        row.data = {
-            field: row.data[field] for field in item_fields if field in row.data
-        }
+def _construct_consolidated_report_select(
+    db: Session,
+    report: Report,
+    plan: dict[str, Any],
+    report_query: Select[tuple[EventRecord]],
+    field_calculator: Optional[
+        Callable[
+            [
+                Session,
+                Select[tuple[EventRecord]],
+                list[str],
+                deps.PaginatedParams,
+            ],
+            list[event_record.EventRecord],
+        ]
+    ],
+    page_params: Optional[deps.PaginatedParams],
+) -> tuple[Select[tuple[EventRecord]], list[event_record.EventRecord]]:
+    # Names are resolved in the report plan, so consolidated rows are scoped by event id
+    # without joining the project structure tables.
+    if report.events:
+        report_query = report_query.where(EventRecord.event_id.in_(plan["event_ids"]))
+
+    if report.instruments:
+        report_query = report_query.where(
+            EventRecord.event_id.in_(plan["instrument_event_ids"])
+        )
+
+    if report.calculated_event_fields and field_calculator and page_params:
+        calculated_report_data = field_calculator(
+            db, report_query, report.calculated_event_fields, page_params
+        )
+    else:
+        calculated_report_data = []
+
+    if report.fields:
+        report_query = report_query.where(
+            EventRecord.event_id.in_(plan["field_event_ids"])
+        )
+
+    return report_query, calculated_report_data
+
+
+def consolidated_report_fields(db: Session, report: Report) -> list[str]:
+    """
+    The data fields a consolidated report should return. Consolidated rows contain data from
+    every non-repeating instrument within their event, so when a report is scoped to a set of
+    instruments, only the fields belonging to those instruments are surfaced.
+    """
+    return current_report_plan(db, report)["consolidated_fields"]
+
+
+def report_count_key(
+    db: Session,
+    report: Report,
+    model: type[Union[Event, Instrument, EventRecord]],
+    generation: int,
+) -> Hashable:
+    """
+    Identifies the rows of a report at a data generation, so their count may be cached
+    without compiling the report query. The filter cache key covers the report's filters,
+    requested records, and the project structure, and the plan covers how rows are scoped.
+    """
+    return (
+        filter_cache_key(
+            generation, get_catalog(db), report.filters or {}, report.records or None
+        ),
+        model.__tablename__,
+        fingerprint(report.plan),
+    )
+
+
+def _project_element_object(
+    model: type[Union[ProjectEvent, ProjectInstrument]]
+) -> ColumnElement:
+    return func.json_build_object(
+        "id",
+        model.id,
+        "name",
+        model.name,
+        "created",
+        model.created,
+        "modified",
+        model.modified,
+        "repeating",
+        model.repeating,
+    )
+
+
+def _project_element_json(
+    model: type[Union[ProjectEvent, ProjectInstrument]], element_id: ColumnElement
+) -> ColumnElement:
+    return (
+        select(_project_element_object(model))
+        .where(model.id == element_id)
+        .scalar_subquery()
+    )
+
+
+# jsonb_build_object takes at most 100 arguments, so projections are built in chunks of this
+# many fields.
+PROJECTION_CHUNK_SIZE = 50
+
+
+def project_data(data: ColumnElement, fields: Optional[list[str]]) -> ColumnElement:
+    """
+    Projects a JSONB data column to the provided fields within Postgres, so only those
+    fields are sent to the client. Fields absent from a row are absent from its projection.
+    Data is not projected if no fields are provided.
+    """
+    if not fields:
+        return data
+
+    chunks = [
+        func.jsonb_build_object(
+            *(
+                element
+                for field in fields[start : start + PROJECTION_CHUNK_SIZE]
+                for element in (field, data[field])
+            )
+        )
+        for start in range(0, len(fields), PROJECTION_CHUNK_SIZE)
+    ]
+
+    projection = chunks[0]
+    for chunk in chunks[1:]:
+        projection = projection.op("||")(chunk)
+
+    return func.jsonb_strip_nulls(projection)
+
+
+def report_row_json(
+    model: type[Union[Event, Instrument, EventRecord]],
+    fields: Optional[list[str]] = None,
+) -> Callable[[FromClause], ColumnElement]:
+    """
+    Builds the JSON object of a report row within Postgres, in the shape of the view model
+    of the passed model. When fields are provided, only those data fields are surfaced.
+    """
+
+    def row_json(page: FromClause) -> ColumnElement:
+        elements: list[Any] = [
+            "id",
+            page.c.id,
+            "recordId",
+            page.c.record_id,
+            "event",
+            _project_element_json(ProjectEvent, page.c.event_id),
+        ]
+
+        if model is not EventRecord:
+            elements += [
+                "instrument",
+                _project_element_json(ProjectInstrument, page.c.instrument_id),
+            ]
+
+        elements += [
+            "repeatInstance",
+            page.c.repeat_instance,
+            "data",
+            project_data(page.c.data, fields),
+            "created",
+            page.c.created,
+            "modified",
+            page.c.modified,
+        ]
+
+        return func.json_build_object(*elements)
+
+    return row_json
+
+
+def report_items_json(
+    model: type[Union[Event, Instrument, EventRecord]],
+    fields: Optional[list[str]] = None,
+) -> Callable[[FromClause], ColumnElement]:
+    """
+    Aggregates the rows of a report page into a JSON array of row objects, ordered by
+    (record_id, id).
+    """
+    row_json = report_row_json(model, fields)
+
+    def items_json(page: FromClause) -> ColumnElement:
+        return func.coalesce(
+            func.json_agg(
+                aggregate_order_by(row_json(page), page.c.record_id, page.c.id)
+            ),
+            literal_column("'[]'::json"),
+        )
+
+    return items_json
+
+
+def _project_element_lookup(
+    model: type[Union[ProjectEvent, ProjectInstrument]], element_ids: Select
+) -> ColumnElement:
+    return (
+        select(
+            func.coalesce(
+                func.json_object_agg(model.id, _project_element_object(model)),
+                literal_column("'{}'::json"),
+            )
+        )
+        .where(model.id.in_(element_ids))
+        .scalar_subquery()
+    )
+
+
+def compact_report_items_json(
+    model: type[Union[Event, Instrument, EventRecord]],
+    fields: Optional[list[str]] = None,
+) -> Callable[[FromClause], ColumnElement]:
+    """
+    Aggregates the rows of a report page into a compact, column oriented JSON object.
+    Events and instruments are listed once in lookups keyed by id, and referenced from rows
+    by id. Row attributes are laid out as one array per attribute under `columns`, and
+    data as one array per field under `data`, each ordered by (record_id, id). Fields
+    absent from a row are null in that row's position.
+
+    When fields are provided, only those data fields are surfaced. Otherwise every field
+    present on the page is.
+    """
+
+    def items_json(page: FromClause) -> ColumnElement:
+        def column(element: ColumnElement) -> ColumnElement:
+            return func.coalesce(
+                func.json_agg(aggregate_order_by(element, page.c.record_id, page.c.id)),
+                literal_column("'[]'::json"),
+            )
+
+        if fields:
+            keys = func.unnest(array(fields)).table_valued("key")
+            page_fields = select(keys.c.key)
+        else:
+            keys = func.jsonb_object_keys(page.c.data).table_valued("key")
+            page_fields = select(keys.c.key).select_from(page).join(keys, true())
+
+        page_fields = page_fields.distinct().correlate(None).subquery()
+        data_columns = (
+            select(
+                page_fields.c.key,
+                func.json_agg(
+                    aggregate_order_by(
+                        page.c.data[page_fields.c.key], page.c.record_id, page.c.id
+                    )
+                ).label("field_values"),
+            )
+            .select_from(page_fields)
+            .join(page, true())
+            .group_by(page_fields.c.key)
+            .correlate(None)
+            .subquery()
+        )
+        data = (
+            select(
+                func.coalesce(
+                    func.json_object_agg(
+                        data_columns.c.key, data_columns.c.field_values
+                    ),
+                    literal_column("'{}'::json"),
+                )
+            )
+            .correlate(None)
+            .scalar_subquery()
+        )
+
+        lookups: list[Any] = [
+            "events",
+            _project_element_lookup(
+                ProjectEvent, select(page.c.event_id).correlate(None)
+            ),
+        ]
+        columns: list[Any] = [
+            "id",
+            column(page.c.id),
+            "recordId",
+            column(page.c.record_id),
+            "eventId",
+            column(page.c.event_id),
+        ]
+
+        if model is not EventRecord:
+            lookups += [
+                "instruments",
+                _project_element_lookup(
+                    ProjectInstrument, select(page.c.instrument_id).correlate(None)
+                ),
+            ]
+            columns += ["instrumentId", column(page.c.instrument_id)]
+
+        columns += [
+            "repeatInstance",
+            column(page.c.repeat_instance),
+            "created",
+            column(page.c.created),
+            "modified",
+            column(page.c.modified),
+        ]
+
+        return func.json_build_object(
+            *lookups, "columns", func.json_build_object(*columns), "data", data
+        )
+
+    return items_json
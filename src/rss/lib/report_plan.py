@@ -0,0 +1,160 @@
+import logging
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import Integer, TextualSelect, Update, bindparam, text, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from rss.lib.catalog import CatalogInstrument, SchemaCatalog, get_catalog
+from rss.lib.querybuilder.compiler import compile_filter, filter_criterions
+from rss.lib.querybuilder.operators import criterion_model
+from rss.lib.redcap_interface import storage_layout
+from rss.models.report import Report
+
+logger = logging.getLogger(__name__)
+
+# Incremented whenever the structure of compiled plans changes, so plans compiled by prior
+# versions are recompiled rather than misread.
+PLAN_VERSION = 1
+
+# Filters are persisted as SQL with named parameters, so they can be bound as text on render.
+PLAN_DIALECT = postgresql.psycopg2.dialect(paramstyle="named")
+
+
+def instrument_event_ids(instruments: Iterable[CatalogInstrument]) -> list[int]:
+    return sorted(
+        {event_id for instrument in instruments for event_id in instrument.event_ids}
+    )
+
+
+def _criterion_plans(catalog: SchemaCatalog, filters: dict) -> list[dict[str, Any]]:
+    """
+    Each criterion of the provided filters, with its instrument resolved to an id and the
+    model it is evaluated against.
+    """
+    criterion_plans = []
+    for criterion in filter_criterions(filters):
+        instrument = catalog.instrument(criterion["instrument"])  # type: ignore
+        model = criterion_model(catalog, instrument, criterion.get("field"))  # type: ignore
+
+        criterion_plans.append(
+            {
+                **criterion,
+                "instrument_id": instrument.id,
+                "model": model.__tablename__,
+            }
+        )
+
+    return criterion_plans
+
+
+def compile_report_plan(db: Session, report: Report) -> dict[str, Any]:
+    """
+    Compiles a report against the current project structure. Event, instrument, and field names
+    are resolved to ids, each filter criterion is resolved to the model it is evaluated against,
+    and filters are compiled into a single parameterized statement.
+
+    Raises a `ValueError` if the report refers to names not defined on the project.
+    """
+    catalog = get_catalog(db)
+
+    instruments = [catalog.instrument(instrument) for instrument in report.instruments]
+    field_instruments = [catalog.field_instrument(field) for field in report.fields]
+
+    compiled_filter = compile_filter(
+        db, report.filters or {}, catalog, report.records or None
+    )
+    if compiled_filter is not None:
+        compiled = compiled_filter.compile(
+            dialect=PLAN_DIALECT, compile_kwargs={"render_postcompile": True}
+        )
+        filter_plan: Optional[dict[str, Any]] = {
+            "sql": str(compiled),
+            "parameters": compiled.params,
+        }
+    else:
+        filter_plan = None
+
+    return {
+        "version": PLAN_VERSION,
+        "structure_version": catalog.version,
+        "storage_layout": storage_layout().value,
+        "event_ids": [catalog.event_id(event) for event in report.events],
+        "instrument_ids": sorted({instrument.id for instrument in instruments}),
+        "instrument_event_ids": instrument_event_ids(instruments),
+        "field_instrument_ids": sorted(
+            {instrument.id for instrument in field_instruments}
+        ),
+        "field_event_ids": instrument_event_ids(field_instruments),
+        "consolidated_fields": report.fields
+        or [field for instrument in instruments for field in instrument.fields],
+        "criterions": _criterion_plans(catalog, report.filters or {}),
+        "filter": filter_plan,
+    }
+
+
+def is_current_plan(catalog: SchemaCatalog, plan: Optional[dict[str, Any]]) -> bool:
+    return bool(
+        plan
+        and plan.get("version") == PLAN_VERSION
+        and plan.get("structure_version") == catalog.version
+        and plan.get("storage_layout") == storage_layout().value
+    )
+
+
+def _plan_update(report: Report, plan: dict[str, Any]) -> Update:
+    # Recompiling a plan is not an edit of the report, so `modified` is set to itself rather
+    # than to its `onupdate` default.
+    return (
+        update(Report)
+        .where(Report.uuid == report.uuid)
+        .values(plan=plan, modified=Report.modified)
+    )
+
+
+def current_report_plan(db: Session, report: Report) -> dict[str, Any]:
+    """
+    The plan of the provided report. Reports are compiled when they are saved, so this is
+    usually the persisted plan. Plans compiled against a prior project structure are
+    recompiled and persisted in a short lived session of their own, so the passed session
+    is neither flushed nor committed.
+
+    Raises a `ValueError` if a stale plan no longer compiles against the project.
+    """
+    if is_current_plan(get_catalog(db), report.plan):
+        return report.plan  # type: ignore
+
+    logger.info(f"Plan of report {report.uuid} is stale. Recompiling.")
+
+    plan = compile_report_plan(db, report)
+    with Session(bind=db.get_bind()) as plan_session:
+        plan_session.execute(_plan_update(report, plan))
+        plan_session.commit()
+
+    # The plan is already persisted, so it is set without marking the report as modified.
+    set_committed_value(report, "plan", plan)
+
+    return plan
+
+
+def filter_statement(plan: dict[str, Any]) -> Optional[TextualSelect]:
+    """
+    The compiled filter statement of a report plan, which selects the ids of the records
+    passing the report's filters.
+    """
+    if plan["filter"] is None:
+        return None
+
+    # Postgres casts (`::`) must be escaped so they are not mistaken for named parameters, and
+    # parameters are made unique so they cannot collide with those of enclosing statements.
+    return (
+        text(plan["filter"]["sql"].replace("::", r"\:\:"))
+        .bindparams(
+            *(
+                bindparam(name, value, unique=True)
+                for name, value in plan["filter"]["parameters"].items()
+            )
+        )
+        .columns(record_id=Integer)
+    )
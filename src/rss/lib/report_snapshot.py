@@ -0,0 +1,173 @@
+import logging
+from typing import Optional, Union
+from uuid import UUID
+
+from sqlalchemy import (
+    FromClause,
+    Select,
+    Update,
+    delete,
+    func,
+    insert,
+    literal,
+    literal_column,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql.elements import ColumnElement
+
+from rss.db.session import SessionLocal
+from rss.lib.project_state import data_generation
+from rss.lib.redcap_interface import non_repeating_model
+from rss.lib.report_plan import current_report_plan
+from rss.lib.report import (
+    consolidated_report_fields,
+    construct_report_select,
+    report_row_json,
+)
+from rss.models.event import Event
+from rss.models.event_record import EventRecord
+from rss.models.instrument import Instrument
+from rss.models.report import Report
+from rss.models.report_snapshot import ReportSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+def _materialized_models() -> tuple[type[Union[Event, Instrument, EventRecord]], ...]:
+    return (non_repeating_model(), Instrument)
+
+
+def _calculated_fields(
+    report: Report, model: type[Union[Event, Instrument, EventRecord]]
+) -> list[str]:
+    if model is Instrument:
+        return report.calculated_instrument_fields or []
+
+    return report.calculated_event_fields or []
+
+
+def _snapshot_update(report: Report, generation: int) -> Update:
+    # Page ETags are derived from `modified`, and a refresh is not an edit of the report, so
+    # the snapshot's generation is recorded without bumping it.
+    return (
+        update(Report)
+        .where(Report.uuid == report.uuid)
+        .values(snapshot_generation=generation, modified=Report.modified)
+    )
+
+
+def materialize_report(db: Session, report: Report) -> int:
+    """
+    Renders every row of a report into its snapshot, replacing any prior snapshot. Rows are
+    rendered within Postgres, in the same shape and with the same fields as report pages.
+    The prior snapshot is replaced in a single transaction, so it is never left partially
+    rendered. Returns the number of rendered rows. Commits the passed session.
+
+    Raises a `ValueError` if the report no longer compiles against the project.
+    """
+    # Compiled before any snapshot row is touched, so a report which no longer compiles
+    # fails without writing.
+    current_report_plan(db, report)
+
+    generation = data_generation(db)
+    db.execute(delete(ReportSnapshot).where(ReportSnapshot.report_uuid == report.uuid))
+
+    rendered = 0
+    for model in _materialized_models():
+        report_select, _ = construct_report_select(
+            db, report, model, None, None, calculate_fields=False
+        )
+        fields = (
+            consolidated_report_fields(db, report)
+            if model is EventRecord
+            else report.fields
+        )
+
+        rows = report_select.subquery()
+        result = db.execute(
+            insert(ReportSnapshot).from_select(
+                ["report_uuid", "model", "id", "record_id", "item"],
+                select(
+                    literal(report.uuid, ReportSnapshot.report_uuid.type),
+                    literal(model.__tablename__),
+                    rows.c.id,
+                    rows.c.record_id,
+                    report_row_json(model, fields)(rows),
+                ),
+            )
+        )
+        rendered += result.rowcount
+
+    db.execute(_snapshot_update(report, generation))
+    db.commit()
+
+    # Set as committed, so the next flush of the report does not write it again.
+    set_committed_value(report, "snapshot_generation", generation)
+
+    logger.info(f"Materialized {rendered} rows of report {report.uuid}.")
+    return rendered
+
+
+def materialize_reports(db: Session) -> None:
+    """
+    Renders the snapshot of every materialized report. Run after project data is refreshed.
+    Reports which fail to render, such as those which no longer compile against the project
+    or whose filters fail to cast some value, are skipped and rendered live.
+    """
+    for report in db.scalars(select(Report).where(Report.materialized)).all():
+        try:
+            materialize_report(db, report)
+        except (ValueError, SQLAlchemyError) as e:
+            db.rollback()
+            logger.warning(f"Could not materialize report {report.uuid}: {e}")
+
+
+def materialize_report_in_background(uuid: UUID) -> None:
+    """
+    Renders the snapshot of a report in a session of its own, for use as a background task.
+    """
+    db = SessionLocal()
+    try:
+        report = db.scalars(select(Report).where(Report.uuid == uuid)).one_or_none()
+        if report is not None and report.materialized:
+            materialize_report(db, report)
+    finally:
+        db.close()
+
+
+def snapshot_select(
+    db: Session, report: Report, model: type[Union[Event, Instrument, EventRecord]]
+) -> Optional[Select[tuple[ReportSnapshot]]]:
+    """
+    A select of the snapshot rows of a report, if it is materialized and its snapshot was
+    rendered at the current data generation. Calculated fields are calculated per page, so
+    reports with calculated fields for the passed model are not served from snapshots.
+    """
+    if not report.materialized or model not in _materialized_models():
+        return None
+
+    if _calculated_fields(report, model):
+        return None
+
+    if report.snapshot_generation != data_generation(db):
+        return None
+
+    return select(ReportSnapshot).where(
+        ReportSnapshot.report_uuid == report.uuid,
+        ReportSnapshot.model == model.__tablename__,
+    )
+
+
+def snapshot_items_json(page: FromClause) -> ColumnElement:
+    """
+    Aggregates the rendered rows of a page of snapshot rows into a JSON array.
+    """
+    return func.coalesce(
+        func.json_agg(aggregate_order_by(page.c.item, page.c.record_id, page.c.id)),
+        literal_column("'[]'::json"),
+    )
@@ -0,0 +1,208 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+from uuid import UUID
+
+import redis
+
+from rss.lib.cache import LRUCache
+from rss.rqueue.worker import REDIS_IP, REDIS_PORT
+
+logger = logging.getLogger(__name__)
+
+# TODO Move these to a central config object.
+#
+# Either `memory`, for a cache per process, `redis`, for a cache shared by every replica, or
+# `none`.
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND") or "memory"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE") or 128)
+# Responses larger than this many bytes are not cached, to bound the memory held by the cache.
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES") or 2 * 1024 * 1024)
+# Entries of the Redis cache expire after this many seconds. Entries rendered at a prior data
+# generation are never served, so this only bounds how long they occupy Redis.
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL") or 60 * 60)
+
+REDIS_KEY_PREFIX = "rss:response"
+
+
+def _hit_ratio(hits: int, misses: int) -> float:
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+class ResponseCache(ABC):
+    """
+    A cache of rendered report pages, keyed by the report they render and a tag of the page.
+    Page tags are derived from the data generation and report modification time, so entries
+    are never served once either changes. Entries are also invalidated explicitly, so they
+    do not linger until evicted.
+    """
+
+    @abstractmethod
+    def get(self, report: UUID, tag: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(self, report: UUID, tag: str, response: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def invalidate_report(self, report: UUID) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+    @abstractmethod
+    def stats(self) -> dict[str, Any]:
+        pass
+
+
+class NullResponseCache(ResponseCache):
+    """
+    A response cache which caches nothing.
+    """
+
+    def get(self, report: UUID, tag: str) -> Optional[bytes]:
+        return None
+
+    def set(self, report: UUID, tag: str, response: bytes) -> None:
+        pass
+
+    def invalidate_report(self, report: UUID) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def stats(self) -> dict[str, Any]:
+        return {"backend": "none"}
+
+
+class MemoryResponseCache(ResponseCache):
+    """
+    A response cache held in the memory of this process, evicting the least recently used
+    page once full.
+    """
+
+    def __init__(self, max_size: int):
+        self._cache: LRUCache[bytes] = LRUCache(max_size)
+        self.invalidations = 0
+
+    def get(self, report: UUID, tag: str) -> Optional[bytes]:
+        return self._cache.get((report, tag))
+
+    def set(self, report: UUID, tag: str, response: bytes) -> None:
+        if len(response) <= RESPONSE_CACHE_MAX_BYTES:
+            self._cache.set((report, tag), response)
+
+    def invalidate_report(self, report: UUID) -> None:
+        for key in self._cache.keys():
+            if key[0] == report and self._cache.delete(key):  # type: ignore
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        self.invalidations += len(self._cache)
+        self._cache.clear()
+
+    def stats(self) -> dict[str, Any]:
+        stats = self._cache.stats()
+        return {
+            "backend": "memory",
+            **stats,
+            "hit_ratio": _hit_ratio(stats["hits"], stats["misses"]),
+            "invalidations": self.invalidations,
+        }
+
+
+class RedisResponseCache(ResponseCache):
+    """
+    A response cache held in Redis and shared by every replica. Entries expire after
+    `RESPONSE_CACHE_TTL` seconds, and are otherwise evicted under the eviction policy of the
+    Redis instance. Redis errors are logged and treated as cache misses, so an unavailable
+    cache never fails a render.
+
+    Hits, misses and invalidations are counted by this process. Evictions and expirations
+    are counted by Redis, across all of its keys.
+    """
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _key(self, report: UUID, tag: str) -> str:
+        digest = tag.strip('"')
+        return f"{REDIS_KEY_PREFIX}:{report}:{digest}"
+
+    def _delete_matching(self, pattern: str) -> None:
+        keys = list(self.client.scan_iter(match=pattern, count=1000))
+        if keys:
+            self.invalidations += self.client.delete(*keys)  # type: ignore
+
+    def get(self, report: UUID, tag: str) -> Optional[bytes]:
+        try:
+            response = self.client.get(self._key(report, tag))
+        except redis.RedisError as e:
+            logger.warning(f"Could not read from the response cache: {e}")
+            response = None
+
+        if response is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return response  # type: ignore
+
+    def set(self, report: UUID, tag: str, response: bytes) -> None:
+        if len(response) > RESPONSE_CACHE_MAX_BYTES:
+            return
+
+        try:
+            self.client.set(self._key(report, tag), response, ex=RESPONSE_CACHE_TTL)
+        except redis.RedisError as e:
+            logger.warning(f"Could not write to the response cache: {e}")
+
+    def invalidate_report(self, report: UUID) -> None:
+        try:
+            self._delete_matching(f"{REDIS_KEY_PREFIX}:{report}:*")
+        except redis.RedisError as e:
+            logger.warning(f"Could not invalidate report {report} in the cache: {e}")
+
+    def clear(self) -> None:
+        try:
+            self._delete_matching(f"{REDIS_KEY_PREFIX}:*")
+        except redis.RedisError as e:
+            logger.warning(f"Could not clear the response cache: {e}")
+
+    def stats(self) -> dict[str, Any]:
+        try:
+            server: dict[str, Any] = self.client.info("stats")  # type: ignore
+        except redis.RedisError as e:
+            logger.warning(f"Could not read response cache statistics: {e}")
+            server = {}
+
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": _hit_ratio(self.hits, self.misses),
+            "invalidations": self.invalidations,
+            "evictions": server.get("evicted_keys"),
+            "expirations": server.get("expired_keys"),
+        }
+
+
+def _configured_response_cache() -> ResponseCache:
+    if RESPONSE_CACHE_BACKEND == "redis":
+        return RedisResponseCache(redis.Redis(host=REDIS_IP, port=REDIS_PORT))
+
+    if RESPONSE_CACHE_BACKEND == "none":
+        return NullResponseCache()
+
+    return MemoryResponseCache(RESPONSE_CACHE_SIZE)
+
+
+response_cache: ResponseCache = _configured_response_cache()
@@ -1,8 +1,11 @@
 __all__ = [
     "authorized_user",
     "event",
+    "event_record",
     "instrument",
     "report",
+    "report_snapshot",
     "project",
+    "project_state",
     "user",
 ]
@@ -14,7 +14,8 @@ class Event(Base):
     __table_args__ = (
         # All rows must be unique across these four identifiers.
         UniqueConstraint("record_id", "repeat_instance", "event_id", "instrument_id"),
-        Index("event_record_id_idx", "record_id"),
+        # Also orders rows by (record_id, id), the key reports are paginated over.
+        Index("event_record_id_idx", "record_id", "id"),
         Index("event_event_instrument_idx", "event_id", "instrument_id"),
     )
 
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import mapped_column, Mapped, relationship
+from sqlalchemy.dialects.postgresql import JSONB
+
+from rss.db.base import Base
+from rss.models.project import ProjectEvent
+
+
+class EventRecord(Base):
+    """
+    Consolidated storage for non-repeating REDCap data. Rather than storing one row per
+    (record, event, instrument) like the `Event` model, every non-repeating instrument
+    within an event is merged into a single row per (record, event). The instrument a
+    given data key belongs to is derived from `ProjectField`.
+    """
+
+    __tablename__ = "event_record"
+
+    __table_args__ = (
+        # All rows must be unique across these three identifiers.
+        UniqueConstraint("record_id", "repeat_instance", "event_id"),
+        # Also orders rows by (record_id, id), the key reports are paginated over.
+        Index("event_record_record_id_idx", "record_id", "id"),
+        Index("event_record_event_idx", "event_id"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    record_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    event_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("project_event.id"), nullable=False
+    )
+    repeat_instance: Mapped[int] = mapped_column(Integer, nullable=True)
+
+    # Map python dict to psql JSONB. Anytime we interact with this column
+    # via SQLAlchemy, it will be via dictionary operators.
+    data: Mapped[dict] = mapped_column(JSONB, nullable=True)
+
+    created = mapped_column(DateTime, nullable=True, default=datetime.now)
+    modified = mapped_column(
+        DateTime, nullable=True, default=datetime.now, onupdate=datetime.now
+    )
+
+    # See comment in ./project.py. For now, this is fine as a one way relationship
+    event: Mapped[ProjectEvent] = relationship("ProjectEvent")
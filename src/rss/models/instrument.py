@@ -14,7 +14,8 @@ class Instrument(Base):
     __table_args__ = (
         # All rows must be unique across these four identifiers.
         UniqueConstraint("record_id", "repeat_instance", "event_id", "instrument_id"),
-        Index("instrument_record_id_idx", "record_id"),
+        # Also orders rows by (record_id, id), the key reports are paginated over.
+        Index("instrument_record_id_idx", "record_id", "id"),
         Index("instrument_event_instrument_idx", "event_id", "instrument_id"),
     )
 
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 
 from sqlalchemy import (
     Column,
@@ -118,6 +119,10 @@ class ProjectField(Base):
     )
     name: Mapped[str] = mapped_column(String, nullable=False)
 
+    # REDCap data dictionary type information, used to type instrument views.
+    field_type: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    validation: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+
     created: Mapped[datetime] = mapped_column(
         DateTime, nullable=True, default=datetime.now
     )
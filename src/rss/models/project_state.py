@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer
+from sqlalchemy.orm import mapped_column, Mapped
+from sqlalchemy.dialects.postgresql import JSONB
+
+from rss.db.base import Base
+
+
+class ProjectState(Base):
+    """
+    Single row table tracking the state of the relational REDCap project held by this instance.
+    """
+
+    __tablename__ = "project_state"  # type: ignore
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    # Maps each exported element of the REDCap project structure to a fingerprint of
+    # the export it was last synced from.
+    structure_fingerprint: Mapped[dict[str, str]] = mapped_column(
+        JSONB, nullable=False, default=dict
+    )
+    # Incremented whenever the relational project structure changes.
+    structure_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Incremented whenever project data is cleared, refreshed, or upserted.
+    data_generation: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    created: Mapped[datetime] = mapped_column(
+        DateTime, nullable=True, default=datetime.now
+    )
+    modified: Mapped[datetime] = mapped_column(
+        DateTime, nullable=True, default=datetime.now, onupdate=datetime.now
+    )
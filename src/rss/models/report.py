@@ -2,7 +2,7 @@ from datetime import datetime
 from uuid import uuid4
 from typing import Optional, Any
 
-from sqlalchemy import DateTime, String
+from sqlalchemy import Boolean, DateTime, Integer, String
 from sqlalchemy.orm import mapped_column, Mapped
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 
@@ -26,8 +26,14 @@ class Report(Base):
     calculated_instrument_fields: Mapped[list[str]] = mapped_column(
         JSONB, nullable=False
     )
+    # The report compiled against a specific project structure. See `rss.lib.report_plan`.
+    plan: Mapped[Optional[dict[str, Any]]] = mapped_column(JSONB, nullable=True)
+    # Materialized reports are rendered into `ReportSnapshot` rows after each refresh. The
+    # snapshot is only served while the data generation it was rendered at is current.
+    materialized: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    snapshot_generation: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
     created = mapped_column(DateTime, nullable=True, default=datetime.now)
     modified = mapped_column(
-        DateTime, nullable=True, default=datetime.now, onupdate=datetime.now()
+        DateTime, nullable=True, default=datetime.now, onupdate=datetime.now
     )
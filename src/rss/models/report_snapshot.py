@@ -0,0 +1,33 @@
+from sqlalchemy import ForeignKey, Index, Integer, String
+from sqlalchemy.orm import mapped_column, Mapped
+from sqlalchemy.dialects.postgresql import JSON, UUID
+
+from rss.db.base import Base
+
+
+class ReportSnapshot(Base):
+    """
+    A rendered row of a materialized report. Rows are stored as the JSON they are rendered
+    to, so materialized reports are served without evaluating filters or encoding rows.
+    See `rss.lib.report_snapshot`.
+    """
+
+    __tablename__ = "report_snapshot"  # type: ignore
+
+    __table_args__ = (
+        Index("report_snapshot_key_idx", "report_uuid", "model", "record_id", "id"),
+    )
+
+    report_uuid: Mapped[UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("report.uuid", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # The table of the rendered row, one of `event`, `instrument`, or `event_record`.
+    model: Mapped[str] = mapped_column(String, primary_key=True)
+    # The id of the rendered row within its table.
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    record_id: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    # Stored as JSON rather than JSONB, so rendered rows are passed through verbatim.
+    item: Mapped[dict] = mapped_column(JSON, nullable=False)
@@ -1,19 +1,34 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 import logging
 import math
+from typing import Optional, Union
 from redcap.project import Project
 from sqlalchemy.orm import Session
 
 from rss import deps
 from rss.lib.authorization import require_authorized_admin
+from rss.lib.catalog import invalidate_catalog
+from rss.lib.conditional import entity_tag, not_modified, request_tag_parts
+from rss.lib.instrument_views import drop_instrument_views, sync_instrument_views
+from rss.lib.maintenance import post_load_maintenance
+from rss.lib.project_state import (
+    bump_data_generation,
+    data_generation,
+    reset_project_structure,
+    structure_version,
+)
+from rss.lib.report_snapshot import materialize_reports
+from rss.lib.response_cache import response_cache
 from rss.lib.redcap_interface import (
     build_event_map,
     build_form_field_map,
     build_repeat_instruments_map,
+    non_repeating_model,
     relational_redcap,
     relational_refresh,
 )
 from rss.models.event import Event
+from rss.models.event_record import EventRecord
 from rss.models.instrument import Instrument
 from rss.models.project import (
     ProjectArm,
@@ -36,6 +51,21 @@ logger = logging.getLogger()
 logger.setLevel("INFO")
 
 
+def _structure_not_modified(
+    db: Session, request: Request, response: Response
+) -> Optional[Response]:
+    """
+    Tags a response derived from the relational project structure with an ETag, returning
+    a 304 if the client already holds it.
+    """
+    etag = entity_tag(*request_tag_parts(request), structure_version(db))
+    unmodified = not_modified(request, etag)
+    if unmodified is None:
+        response.headers["ETag"] = etag
+
+    return unmodified
+
+
 @router.get(
     "/metadata",
     status_code=200,
@@ -93,13 +123,22 @@ def get_project_field_names(
     responses={404: {}},
 )
 def get_record_ids(
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
-) -> list[int]:
+) -> Union[list[int], Response]:
     """
     Returns a list of REDCap record IDs.
     """
+    etag = entity_tag(*request_tag_parts(request), data_generation(db))
+    unmodified = not_modified(request, etag)
+    if unmodified is not None:
+        return unmodified
+
+    response.headers["ETag"] = etag
+    model = non_repeating_model()
     return sorted(
-        set(record_id[0] for record_id in db.query(Event.record_id).tuples().all())
+        set(record_id[0] for record_id in db.query(model.record_id).tuples().all())
     )
 
 
@@ -110,11 +149,17 @@ def get_record_ids(
     responses={404: {}},
 )
 def get_internal_event_mappings(
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
-) -> list[ProjectEvent]:
+) -> Union[list[ProjectEvent], Response]:
     """
     Returns a list of internal relational REDCap event mappings.
     """
+    unmodified = _structure_not_modified(db, request, response)
+    if unmodified is not None:
+        return unmodified
+
     return db.query(ProjectEvent).all()
 
 
@@ -125,11 +170,17 @@ def get_internal_event_mappings(
     responses={404: {}},
 )
 def get_internal_instrument_mappings(
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
-) -> list[ProjectInstrument]:
+) -> Union[list[ProjectInstrument], Response]:
     """
     Returns a list of internal relational REDCap instrument mappings.
     """
+    unmodified = _structure_not_modified(db, request, response)
+    if unmodified is not None:
+        return unmodified
+
     return db.query(ProjectInstrument).all()
 
 
@@ -140,11 +191,17 @@ def get_internal_instrument_mappings(
     responses={404: {}},
 )
 def get_internal_field_mappings(
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
-) -> list[ProjectField]:
+) -> Union[list[ProjectField], Response]:
     """
     Returns a list of internal relational REDCap field mappings.
     """
+    unmodified = _structure_not_modified(db, request, response)
+    if unmodified is not None:
+        return unmodified
+
     return db.query(ProjectField).all()
 
 
@@ -156,7 +213,10 @@ def clear_project_data(
     """
     Refreshes all study data with newly extracted REDCap project data.
     """
+    drop_instrument_views(db)
+
     db.query(Event).delete()
+    db.query(EventRecord).delete()
     db.query(Instrument).delete()
 
     db.query(ProjectField).delete()
@@ -165,7 +225,13 @@ def clear_project_data(
     db.query(ProjectEvent).delete()
     db.query(ProjectArm).delete()
 
+    # The relational structure is gone, so the next refresh must rebuild it in full.
+    reset_project_structure(db)
+    bump_data_generation(db)
+
     db.commit()
+    invalidate_catalog()
+    response_cache.clear()
 
 
 @router.post("/refresh", status_code=200, response_model=int, responses={404: {}})
@@ -183,20 +249,38 @@ def refresh_project_data(
 
     logger.info(f"Refreshing {next_record} records in batches of {batch_size}.")
 
-    relational_redcap(redcap_project, db)
+    structure_changed = relational_redcap(redcap_project, db)
     db.commit()
 
+    if structure_changed:
+        invalidate_catalog()
+
     logger.info("Done building project structure. Clearing project data.")
 
     db.query(Event).delete()
+    db.query(EventRecord).delete()
     db.query(Instrument).delete()
-    db.flush()
+    bump_data_generation(db)
 
     logger.info("Done clearing existing project data. Refreshing data.")
 
     # Commit as we go within this function, to avoid OOM errors on large transactions.
     relational_refresh(redcap_project, db, batch_size)
     db.commit()
+
+    logger.info("Done refreshing data. Syncing instrument views.")
+
+    sync_instrument_views(db)
+    db.commit()
+
+    logger.info("Done syncing instrument views. Running post-load maintenance.")
+
+    post_load_maintenance(db)
+
+    logger.info("Done with post-load maintenance. Materializing reports.")
+
+    materialize_reports(db)
+    response_cache.clear()
     return next_record
 
 
@@ -1,23 +1,53 @@
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.responses import StreamingResponse
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy import Select, select
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import Session
 
-from typing import Callable, Optional
+from typing import Any, Callable, Hashable, Optional, Union
 
 from rss import deps
 from rss.lib.authorization import (
+    require_authorized_admin,
     require_authorized_editor,
     require_authorized_viewer,
 )
-from rss.lib.pagination import paginate
-from rss.lib.report import filter_item_fields, construct_report_select
+from rss.lib.conditional import entity_tag, not_modified, request_tag_parts
+from rss.lib.export import EXPORT_MEDIA_TYPES, ExportFormat, stream_export
+from rss.lib.pagination import count_cache, paginate_json
+from rss.lib.project_state import data_generation
+from rss.lib.querybuilder.cache import cache_stats
+from rss.lib.querybuilder.explain import explain_filter
+from rss.lib.report_plan import compile_report_plan
+from rss.lib.report import (
+    consolidated_report_fields,
+    construct_report_select,
+    compact_report_items_json,
+    report_count_key,
+    report_items_json,
+)
+from rss.lib.response_cache import response_cache
+from rss.lib.report_snapshot import (
+    materialize_report_in_background,
+    snapshot_items_json,
+    snapshot_select,
+)
 from rss.models.event import Event
+from rss.models.event_record import EventRecord
 from rss.models.instrument import Instrument
 from rss.models.report import Report
 from rss.models.user import User
-from rss.view_models import event, instrument, report, pagination
+from rss.view_models import event, event_record, instrument, report, pagination
 
 # Router for handling all interactions with REDCap
 router = APIRouter(
@@ -27,6 +57,38 @@ router = APIRouter(
 )
 
 
+def _compile_plan(db: Session, item: Report) -> dict:
+    try:
+        return compile_report_plan(db, item)
+    except ValueError as e:
+        raise HTTPException(422, f"The report could not be compiled: {e}")
+
+
+def _construct_report_select(
+    db: Session,
+    item: Report,
+    model: type[Union[Event, Instrument, EventRecord]],
+    field_calculator: Optional[Callable],
+    page_params: Optional[deps.PaginatedParams],
+    calculate_fields: bool = True,
+) -> tuple[Select, list]:
+    # Saved reports are recompiled if the project structure changed since they were saved,
+    # which fails if they refer to elements no longer on the project.
+    try:
+        return construct_report_select(
+            db,
+            item,
+            model,
+            field_calculator,
+            page_params,
+            calculate_fields,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            409, f"The report no longer compiles against the project: {e}"
+        )
+
+
 @router.get(
     "",
     status_code=200,
@@ -50,6 +112,7 @@ def get_reports(
 )
 def create_report(
     report_create: report.CreatedReport,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(deps.get_db),
     user: User = Depends(require_authorized_editor),
 ) -> Report:
@@ -57,8 +120,14 @@ def create_report(
     Lists all reports currently stored in the database.
     """
     item = Report(**jsonable_encoder(report_create, by_alias=False))
+    item.plan = _compile_plan(db, item)
+
     db.add(item)
     db.commit()
+
+    if item.materialized:
+        background_tasks.add_task(materialize_report_in_background, item.uuid)
+
     return item
 
 
@@ -79,6 +148,7 @@ def delete_report(
     item = db.query(Report).filter(Report.uuid == uuid).delete()
 
     db.commit()
+    response_cache.invalidate_report(uuid)
     return bool(item)
 
 
@@ -90,9 +160,11 @@ def delete_report(
 )
 def get_report(
     uuid: UUID,
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
     user: User = Depends(require_authorized_viewer),
-) -> Report:
+) -> Union[Report, Response]:
     """
     Lists all reports currently stored in the database.
     """
@@ -101,6 +173,12 @@ def get_report(
     if not item:
         raise HTTPException(404, "The requested report {uuid} could not be found.")
 
+    etag = entity_tag(*request_tag_parts(request), item.modified)
+    unmodified = not_modified(request, etag)
+    if unmodified is not None:
+        return unmodified
+
+    response.headers["ETag"] = etag
     return item
 
 
@@ -112,6 +190,7 @@ def get_report(
 )
 def modify_report(
     report_modify: report.ModifiedReport,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(deps.get_db),
     user: User = Depends(require_authorized_editor),
 ) -> Report:
@@ -128,11 +207,81 @@ def modify_report(
     for attr in vars(report_modify):
         item.__setattr__(attr, report_modify.__getattribute__(attr))
 
+    item.plan = _compile_plan(db, item)
+
+    # The snapshot no longer reflects the report, so the report is rendered live until it has
+    # been re-materialized.
+    item.snapshot_generation = None
+
     db.add(item)
     db.commit()
+    response_cache.invalidate_report(item.uuid)
+
+    if item.materialized:
+        background_tasks.add_task(materialize_report_in_background, item.uuid)
+
     return item
 
 
+@router.get(
+    "/cache/stats",
+    status_code=200,
+    response_model=dict[str, dict[str, Any]],
+    responses={404: {}},
+)
+def get_cache_stats(
+    user: User = Depends(require_authorized_admin),
+) -> dict[str, dict[str, Any]]:
+    """
+    Reports the size, hit ratio and evictions of the rendered page cache, and the sizes, hits
+    and evictions of the caches report rendering relies on.
+    """
+    return {
+        "response": response_cache.stats(),
+        "count": count_cache.stats(),
+        **cache_stats(),
+    }
+
+
+@router.post(
+    "/explain",
+    status_code=200,
+    response_model=report.FilterExplanation,
+    responses={404: {}, 422: {}},
+)
+def explain_report_filters(
+    explain_request: report.FilterExplanationRequest,
+    db: Session = Depends(deps.get_db),
+    user: User = Depends(require_authorized_editor),
+) -> dict:
+    """
+    Profiles the filters of a saved report, or of an ad-hoc filter dictionary, returning the
+    SQL, analyzed query plan, row count, timing and cache status of each filter node.
+    """
+    if explain_request.uuid:
+        item = db.scalars(
+            select(Report).where(Report.uuid == explain_request.uuid)
+        ).one_or_none()
+
+        if not item:
+            raise HTTPException(
+                404, f"The requested report {explain_request.uuid} could not be found."
+            )
+
+        filters, records = item.filters, item.records
+    elif explain_request.filters is not None:
+        filters, records = explain_request.filters, explain_request.records
+    else:
+        raise HTTPException(422, "Either a report uuid or filters must be provided.")
+
+    try:
+        return explain_filter(db, filters or {}, records or None)
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+    except DBAPIError as e:
+        raise HTTPException(422, f"The filters could not be explained: {e.orig}")
+
+
 # TODO: Should we consider merging event and instrument data fields? It probably depends on the
 #       'axis of interest' for the user, so might be best to do that sort of thing on the client
 #       side.
@@ -141,32 +290,125 @@ def modify_report(
 #       across repeat instruments). Do we want to aggregate repeat instance data across the repeat
 #       instance number axis?
 
-# TODO: Consider fetching record_ids / event_ids using this method, executing SELECTs against the DB
-#       without an ORM, manually turning returned rows into dictionaries, and returning an ORJSONResponse
-#       directly. When operating on large JSON responses, FASTAPIs native jsonable_encoder is called on
-#       each object, dramatically reducing performance. If we could speed up this encoding and JSON dumping
-#       step, we could help this endpoint out dramatically.
+# NOTE: Report pages are built as JSON within Postgres and returned directly. When operating on
+#       large JSON responses, loading ORM objects, validating them, and running FastAPIs native
+#       jsonable_encoder on each object dramatically reduces performance. Only calculated items,
+#       which are few, are encoded in Python.
+#
+#       Pages requested with `compact=true` list events and instruments once in lookups keyed
+#       by id and lay rows out column-wise, with one array of values per attribute and per
+#       data field. Calculated items are then returned separately, under `calculatedItems`.
+#
+#       Materialized reports are rendered into snapshots after each refresh, and full pages of
+#       them are served from their snapshot while it is current.
+#
+#       Pages are tagged with an ETag derived from the request, the data generation and when the
+#       report was last modified. Requests whose `If-None-Match` matches are answered with a 304
+#       before the report is rendered. Rendered pages are cached under the same tag, in memory or
+#       in Redis, so pages rendered by one replica may be served by every other.
+
+
+def _report_etag(request: Request, item: Report, generation: int) -> str:
+    return entity_tag(*request_tag_parts(request), generation, item.modified)
+
+
+def _cached_report_page(item: Report, etag: str) -> Optional[Response]:
+    page = response_cache.get(item.uuid, etag)
+    if page is None:
+        return None
+
+    return Response(page, media_type="application/json", headers={"ETag": etag})
+
+
+def _cache_report_page(item: Report, etag: str, response: Response) -> Response:
+    response_cache.set(item.uuid, etag, response.body)
+    return response
+
+
+def _render_snapshot_page(
+    db: Session,
+    item: Report,
+    model: type[Union[Event, Instrument, EventRecord]],
+    page_params: deps.PaginatedParams,
+    compact: bool,
+    etag: str,
+    generation: int,
+) -> Optional[Response]:
+    if compact:
+        return None
+
+    snapshot = snapshot_select(db, item, model)
+    if snapshot is None:
+        return None
+
+    # Snapshots hold the same rows as the report at their generation, so they share counts.
+    return Response(
+        paginate_json(
+            db,
+            snapshot,
+            page_params,
+            snapshot_items_json,
+            count_key=report_count_key(db, item, model, generation),
+        ),
+        media_type="application/json",
+        headers={"ETag": etag},
+    )
+
+
+def _render_report_page(
+    db: Session,
+    report_select: Select,
+    model: type[Union[Event, Instrument, EventRecord]],
+    fields: Optional[list[str]],
+    calculated_items: list,
+    page_params: deps.PaginatedParams,
+    compact: bool,
+    etag: str,
+    count_key: Hashable,
+) -> Response:
+    if compact:
+        items_json = compact_report_items_json(model, fields)
+    else:
+        items_json = report_items_json(model, fields)
+
+    return Response(
+        paginate_json(
+            db,
+            report_select,
+            page_params,
+            items_json,
+            calculated_items,
+            "calculatedItems" if compact else None,
+            count_key,
+        ),
+        media_type="application/json",
+        headers={"ETag": etag},
+    )
 
 
-# TODO: Do we want to implement some sort of pagination to deal with the above...
 @router.get(
     "/events/{uuid}",
     status_code=200,
-    response_model=pagination.PaginatedResponse[event.Event],
+    response_model=Union[
+        pagination.PaginatedResponse[event.Event],
+        pagination.CompactPaginatedResponse[report.CompactReportItems, event.Event],
+    ],
     responses={404: {}},
 )
 def render_report_events(
     uuid: UUID,
+    request: Request,
     db: Session = Depends(deps.get_db),
     user: User = Depends(require_authorized_viewer),
     page_params: deps.PaginatedParams = Depends(),
+    compact: bool = Query(False),
     event_field_calculator: Optional[
         Callable[
             [Session, Select[tuple[Event]], list[str], deps.PaginatedParams],
             list[event.Event],
         ]
     ] = Depends(deps.get_event_calculator),
-) -> pagination.PaginatedResponse[event.Event]:
+) -> Response:
     """
     Lists all reports currently stored in the database.
     """
@@ -175,45 +417,71 @@ def render_report_events(
     if not item:
         raise HTTPException(404, "The requested report {uuid} could not be found.")
 
-    event_select, calculated_events = construct_report_select(
-        db, item, Event, event_field_calculator, page_params
-    )
-    response_data = paginate(db, event_select, page_params)
+    generation = data_generation(db)
+    etag = _report_etag(request, item, generation)
+    unmodified = not_modified(request, etag)
+    if unmodified is not None:
+        return unmodified
 
-    # Done filtering queries, so pull out field values. The report only needs to return
-    # rows given by the `fields` subset.
-    #
-    # NOTE: This MUST be done last since this logic has the side-effect of modifying any `.data`
-    #       field that it touches. Ie: If a calculated field relies on some event field that
-    #       we are not returning to the user, the field will not be present in the data model
-    #       if this logic occurs prior to the calculated field calculations.
-    if item.fields:
-        filter_item_fields(item.fields, response_data)
+    cached_page = _cached_report_page(item, etag)
+    if cached_page is not None:
+        return cached_page
 
-    # Full response data is a combination of calculated and REDCap based events
-    response_data["items"] = [*response_data["items"], *calculated_events]
+    snapshot_page = _render_snapshot_page(
+        db, item, Event, page_params, compact, etag, generation
+    )
+    if snapshot_page is not None:
+        return _cache_report_page(item, etag, snapshot_page)
 
-    return response_data
+    event_select, calculated_events = _construct_report_select(
+        db, item, Event, event_field_calculator, page_params
+    )
+
+    # Full response data is a combination of calculated and REDCap based events. The report
+    # only needs to return data given by the `fields` subset, which is done as the page is
+    # built, so calculated fields may still rely on data fields which are not returned.
+    return _cache_report_page(
+        item,
+        etag,
+        _render_report_page(
+            db,
+            event_select,
+            Event,
+            item.fields,
+            calculated_events,
+            page_params,
+            compact,
+            etag,
+            report_count_key(db, item, Event, generation),
+        ),
+    )
 
 
 @router.get(
     "/instruments/{uuid}",
     status_code=200,
-    response_model=pagination.PaginatedResponse[instrument.Instrument],
+    response_model=Union[
+        pagination.PaginatedResponse[instrument.Instrument],
+        pagination.CompactPaginatedResponse[
+            report.CompactReportItems, instrument.Instrument
+        ],
+    ],
     responses={404: {}},
 )
 def render_report_instruments(
     uuid: UUID,
+    request: Request,
     db: Session = Depends(deps.get_db),
     user: User = Depends(require_authorized_viewer),
     page_params: deps.PaginatedParams = Depends(),
+    compact: bool = Query(False),
     instrument_field_calculator: Optional[
         Callable[
             [Session, Select[tuple[Instrument]], list[str], deps.PaginatedParams],
             list[instrument.Instrument],
         ]
     ] = Depends(deps.get_instrument_calculator),
-) -> pagination.PaginatedResponse[instrument.Instrument]:
+) -> Response:
     """
     Lists all reports currently stored in the database.
     """
@@ -222,22 +490,194 @@ def render_report_instruments(
     if not item:
         raise HTTPException(404, "The requested report {uuid} could not be found.")
 
-    instrument_select, calculated_instruments = construct_report_select(
+    generation = data_generation(db)
+    etag = _report_etag(request, item, generation)
+    unmodified = not_modified(request, etag)
+    if unmodified is not None:
+        return unmodified
+
+    cached_page = _cached_report_page(item, etag)
+    if cached_page is not None:
+        return cached_page
+
+    snapshot_page = _render_snapshot_page(
+        db, item, Instrument, page_params, compact, etag, generation
+    )
+    if snapshot_page is not None:
+        return _cache_report_page(item, etag, snapshot_page)
+
+    instrument_select, calculated_instruments = _construct_report_select(
         db, item, Instrument, instrument_field_calculator, page_params
     )
-    response_data = paginate(db, instrument_select, page_params)
-
-    # Done filtering queries, so pull out field values. The report only needs to return
-    # rows given by the `fields` subset.
-    #
-    # NOTE: This MUST be done last since this logic has the side-effect of modifying any `.data`
-    #       field that it touches. Ie: If a calculated field relies on some event field that
-    #       we are not returning to the user, the field will not be present in the data model
-    #       if this logic occurs prior to the calculated field calculations.
-    if item.fields:
-        filter_item_fields(item.fields, response_data)
-
-    # Full response data is a combination of calculated and REDCap based events
-    response_data["items"] = [*response_data["items"], *calculated_instruments]
-
-    return response_data
+
+    # Full response data is a combination of calculated and REDCap based events. The report
+    # only needs to return data given by the `fields` subset, which is done as the page is
+    # built, so calculated fields may still rely on data fields which are not returned.
+    return _cache_report_page(
+        item,
+        etag,
+        _render_report_page(
+            db,
+            instrument_select,
+            Instrument,
+            item.fields,
+            calculated_instruments,
+            page_params,
+            compact,
+            etag,
+            report_count_key(db, item, Instrument, generation),
+        ),
+    )
+
+
+@router.get(
+    "/records/{uuid}",
+    status_code=200,
+    response_model=Union[
+        pagination.PaginatedResponse[event_record.EventRecord],
+        pagination.CompactPaginatedResponse[
+            report.CompactReportItems, event_record.EventRecord
+        ],
+    ],
+    responses={404: {}},
+)
+def render_report_records(
+    uuid: UUID,
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    user: User = Depends(require_authorized_viewer),
+    page_params: deps.PaginatedParams = Depends(),
+    compact: bool = Query(False),
+    event_record_field_calculator: Optional[
+        Callable[
+            [Session, Select[tuple[EventRecord]], list[str], deps.PaginatedParams],
+            list[event_record.EventRecord],
+        ]
+    ] = Depends(deps.get_event_record_calculator),
+) -> Response:
+    """
+    Renders the non-repeating data of a report stored in the consolidated storage layout,
+    with one row per (record, event).
+    """
+    item = db.scalars(select(Report).where(Report.uuid == uuid)).one_or_none()
+
+    if not item:
+        raise HTTPException(404, "The requested report {uuid} could not be found.")
+
+    generation = data_generation(db)
+    etag = _report_etag(request, item, generation)
+    unmodified = not_modified(request, etag)
+    if unmodified is not None:
+        return unmodified
+
+    cached_page = _cached_report_page(item, etag)
+    if cached_page is not None:
+        return cached_page
+
+    snapshot_page = _render_snapshot_page(
+        db, item, EventRecord, page_params, compact, etag, generation
+    )
+    if snapshot_page is not None:
+        return _cache_report_page(item, etag, snapshot_page)
+
+    record_select, calculated_records = _construct_report_select(
+        db, item, EventRecord, event_record_field_calculator, page_params
+    )
+
+    # Full response data is a combination of calculated and REDCap based records.
+    return _cache_report_page(
+        item,
+        etag,
+        _render_report_page(
+            db,
+            record_select,
+            EventRecord,
+            consolidated_report_fields(db, item),
+            calculated_records,
+            page_params,
+            compact,
+            etag,
+            report_count_key(db, item, EventRecord, generation),
+        ),
+    )
+
+
+def _export_report(
+    db: Session,
+    uuid: UUID,
+    model: type[Union[Event, Instrument, EventRecord]],
+    export_format: ExportFormat,
+) -> StreamingResponse:
+    item = db.scalars(select(Report).where(Report.uuid == uuid)).one_or_none()
+
+    if not item:
+        raise HTTPException(404, f"The requested report {uuid} could not be found.")
+
+    report_select, _ = _construct_report_select(
+        db, item, model, None, None, calculate_fields=False
+    )
+
+    return StreamingResponse(
+        stream_export(db, item, report_select, model, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{uuid}.{export_format.value}"'
+        },
+    )
+
+
+@router.get(
+    "/events/{uuid}/export",
+    status_code=200,
+    response_class=StreamingResponse,
+    responses={404: {}},
+)
+def export_report_events(
+    uuid: UUID,
+    db: Session = Depends(deps.get_db),
+    user: User = Depends(require_authorized_viewer),
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+) -> StreamingResponse:
+    """
+    Streams every event of a report as newline delimited JSON or CSV. Calculated fields
+    are not exported.
+    """
+    return _export_report(db, uuid, Event, export_format)
+
+
+@router.get(
+    "/instruments/{uuid}/export",
+    status_code=200,
+    response_class=StreamingResponse,
+    responses={404: {}},
+)
+def export_report_instruments(
+    uuid: UUID,
+    db: Session = Depends(deps.get_db),
+    user: User = Depends(require_authorized_viewer),
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+) -> StreamingResponse:
+    """
+    Streams every instrument of a report as newline delimited JSON or CSV. Calculated
+    fields are not exported.
+    """
+    return _export_report(db, uuid, Instrument, export_format)
+
+
+@router.get(
+    "/records/{uuid}/export",
+    status_code=200,
+    response_class=StreamingResponse,
+    responses={404: {}},
+)
+def export_report_records(
+    uuid: UUID,
+    db: Session = Depends(deps.get_db),
+    user: User = Depends(require_authorized_viewer),
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+) -> StreamingResponse:
+    """
+    Streams every consolidated record of a report as newline delimited JSON or CSV.
+    Calculated fields are not exported.
+    """
+    return _export_report(db, uuid, EventRecord, export_format)
@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import ConfigDict
+
+from rss.view_models.base.base import BaseModel
+from rss.view_models.project import ProjectEventSimple
+
+
+class EventRecordBase(BaseModel):
+    id: int
+    record_id: int
+    event: ProjectEventSimple
+    repeat_instance: Optional[int]
+    data: dict[str, str]
+
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
+
+class SavedEventRecord(EventRecordBase):
+    created: datetime
+    modified: datetime
+
+
+class EventRecord(SavedEventRecord):
+    pass
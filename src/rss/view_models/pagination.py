@@ -5,11 +5,28 @@ from rss.view_models.base.base import BaseModel
 
 
 M = TypeVar("M")
+I = TypeVar("I")
 
 
 class PaginatedResponse(BaseModel, Generic[M]):
-    pages: int
-    count: int
+    # Not provided when requested with `count=none`.
+    pages: Optional[int]
+    count: Optional[int]
     items: List[M]
     next_page: Optional[AnyHttpUrl]
     previous_page: Optional[AnyHttpUrl]
+    next_cursor: Optional[str] = None
+    previous_cursor: Optional[str] = None
+
+
+class CompactPaginatedResponse(BaseModel, Generic[I, M]):
+    # Compact pages hold their rows column-wise in a single `items` object, and return
+    # calculated items separately, in the shape of the non-compact rows.
+    pages: Optional[int]
+    count: Optional[int]
+    items: I
+    calculated_items: List[M] = []
+    next_page: Optional[AnyHttpUrl]
+    previous_page: Optional[AnyHttpUrl]
+    next_cursor: Optional[str] = None
+    previous_cursor: Optional[str] = None
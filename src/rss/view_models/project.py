@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 from datetime import datetime
+from typing import Optional
 
 from pydantic import ConfigDict
 
@@ -52,6 +53,8 @@ class ProjectFieldSimple(ProjectElement):
 
 class ProjectField(ProjectElement):
     instrument_id: int
+    field_type: Optional[str]
+    validation: Optional[str]
 
 
 # Rebuild models depended on by external views
@@ -5,6 +5,7 @@ from uuid import UUID
 from pydantic import ConfigDict
 
 from rss.view_models.base.base import BaseModel
+from rss.view_models.project import ProjectEventSimple, ProjectInstrumentSimple
 
 
 class ReportBase(BaseModel):
@@ -22,6 +23,7 @@ class CreatedReport(ReportBase):
     calculated_event_fields: Optional[list[str]]
     calculated_instrument_fields: Optional[list[str]]
     filters: dict[str, Any]
+    materialized: bool = False
 
 
 class ModifiedReport(CreatedReport):
@@ -35,3 +37,43 @@ class SavedReport(ModifiedReport):
 
 class Report(SavedReport):
     pass
+
+
+class CompactReportColumns(BaseModel):
+    id: list[int]
+    record_id: list[int]
+    event_id: list[int]
+    # Consolidated rows are not associated with a single instrument.
+    instrument_id: Optional[list[int]] = None
+    repeat_instance: list[Optional[int]]
+    created: list[Optional[datetime]]
+    modified: list[Optional[datetime]]
+
+
+class CompactReportItems(BaseModel):
+    events: dict[int, ProjectEventSimple]
+    instruments: Optional[dict[int, ProjectInstrumentSimple]] = None
+    columns: CompactReportColumns
+    # One array of values per field, null where a field is absent from a row.
+    data: dict[str, list[Optional[str]]]
+
+
+class FilterExplanationRequest(BaseModel):
+    uuid: Optional[UUID] = None
+    filters: Optional[dict[str, Any]] = None
+    records: Optional[list[int]] = None
+
+
+class FilterExplanation(BaseModel):
+    aggregator: Optional[str]
+    criterion: Optional[dict[str, Any]]
+    sql: Optional[str]
+    parameters: dict[str, Any]
+    plan: Optional[list[dict[str, Any]]]
+    rows: Optional[int]
+    planned_rows: Optional[float]
+    execution_time: Optional[float]
+    wall_time: Optional[float]
+    # Criterion nodes have no cache status, since only whole filters are cached.
+    cached: Optional[bool]
+    children: list["FilterExplanation"]
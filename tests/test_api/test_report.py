@@ -1,9 +1,121 @@
-# TODO
+from typing import Generator
 
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import DataError
 
-class TestStatus:
-    pass
+from rss.deps import get_db
+from rss.lib.authorization import require_authorized_editor
+from rss.routers import report
+from rss.server_main import app
 
+from tests.utils import override_authorized_editor
 
-class TestResponse:
-    pass
+EXPLANATION = {
+    "aggregator": None,
+    "criterion": None,
+    "sql": "SELECT 1",
+    "parameters": {},
+    "plan": [],
+    "rows": 1,
+    "planned_rows": 1.0,
+    "execution_time": 0.1,
+    "wall_time": 0.2,
+    "cached": True,
+    "children": [],
+}
+
+
+class _Session:
+    def scalars(self, statement):
+        return self
+
+    def one_or_none(self):
+        return None
+
+
+@pytest.fixture
+def editor_client() -> Generator[TestClient, None, None]:
+    app.dependency_overrides[get_db] = _Session
+    app.dependency_overrides[require_authorized_editor] = override_authorized_editor
+    with TestClient(app) as c:
+        yield c
+    app.dependency_overrides.clear()
+
+
+class TestExplain:
+    def _explain_with(self, monkeypatch, explain_filter):
+        monkeypatch.setattr(report, "explain_filter", explain_filter)
+
+    def test_explanation_is_returned(self, monkeypatch, editor_client: TestClient):
+        self._explain_with(monkeypatch, lambda db, filters, records: EXPLANATION)
+
+        response = editor_client.post(
+            "/api/v1/reports/explain", json={"filters": {"all": []}}
+        )
+
+        assert response.status_code == 200
+        assert response.json()["cached"] is True
+
+    def test_filters_or_uuid_are_required(self, editor_client: TestClient):
+        response = editor_client.post("/api/v1/reports/explain", json={})
+
+        assert response.status_code == 422
+
+    def test_missing_report_is_not_found(self, editor_client: TestClient):
+        response = editor_client.post(
+            "/api/v1/reports/explain",
+            json={"uuid": "00000000-0000-0000-0000-000000000000"},
+        )
+
+        assert response.status_code == 404
+
+    def test_invalid_filters_are_unprocessable(
+        self, monkeypatch, editor_client: TestClient
+    ):
+        def explain_filter(db, filters, records):
+            raise ValueError("Aggregator some not in accepted aggregators")
+
+        self._explain_with(monkeypatch, explain_filter)
+
+        response = editor_client.post(
+            "/api/v1/reports/explain", json={"filters": {"some": []}}
+        )
+
+        assert response.status_code == 422
+
+    def test_database_errors_are_unprocessable(
+        self, monkeypatch, editor_client: TestClient
+    ):
+        def explain_filter(db, filters, records):
+            raise DataError("EXPLAIN", {}, Exception("invalid input syntax"))
+
+        self._explain_with(monkeypatch, explain_filter)
+
+        response = editor_client.post(
+            "/api/v1/reports/explain", json={"filters": {"all": []}}
+        )
+
+        assert response.status_code == 422
+        assert "invalid input syntax" in response.json()["detail"]
+
+
+class TestRenderReportSchema:
+    @pytest.mark.parametrize(
+        "path, model",
+        [
+            ("events", "Event"),
+            ("instruments", "Instrument"),
+            ("records", "EventRecord"),
+        ],
+    )
+    def test_compact_pages_have_their_own_schema(self, path, model):
+        route = app.openapi()["paths"][f"/api/v1/reports/{path}/{{uuid}}"]
+        schema = route["get"]["responses"]["200"]["content"]["application/json"]
+
+        assert [
+            ref["$ref"].rsplit("/", 1)[-1] for ref in schema["schema"]["anyOf"]
+        ] == [
+            f"PaginatedResponse_{model}_",
+            f"CompactPaginatedResponse_CompactReportItems_{model}_",
+        ]
@@ -0,0 +1,47 @@
+from rss.lib.cache import LRUCache
+
+
+class TestLRUCache:
+    def test_get_counts_hits_and_misses(self):
+        cache: LRUCache[int] = LRUCache(2)
+        cache.set("a", 1)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_evicts_least_recently_used(self):
+        cache: LRUCache[int] = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_zero_size_cache_stores_nothing(self):
+        cache: LRUCache[int] = LRUCache(0)
+        cache.set("a", 1)
+
+        assert len(cache) == 0
+
+    def test_delete_removes_entry(self):
+        cache: LRUCache[int] = LRUCache(2)
+        cache.set("a", 1)
+
+        assert cache.delete("a")
+        assert not cache.delete("a")
+        assert cache.keys() == []
+
+    def test_peek_is_not_counted(self):
+        cache: LRUCache[int] = LRUCache(2)
+        cache.set("a", 1)
+
+        assert cache.peek("a") == 1
+        assert cache.peek("b") is None
+        assert cache.stats()["hits"] == 0
+        assert cache.stats()["misses"] == 0
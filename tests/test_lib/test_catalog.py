@@ -0,0 +1,41 @@
+import pytest
+
+from rss.lib import catalog
+from rss.lib.catalog import SchemaCatalog, get_catalog, invalidate_catalog
+
+
+class TestGetCatalog:
+    @pytest.fixture
+    def versions(self, monkeypatch):
+        versions = {"current": 1, "loads": 0}
+
+        def load_catalog(db):
+            versions["loads"] += 1
+            return SchemaCatalog(versions["current"], {}, {}, {})
+
+        monkeypatch.setattr(
+            catalog, "structure_version", lambda db: versions["current"]
+        )
+        monkeypatch.setattr(catalog, "load_catalog", load_catalog)
+
+        invalidate_catalog()
+        yield versions
+        invalidate_catalog()
+
+    def test_catalog_is_loaded_once_per_version(self, versions):
+        assert get_catalog(None) is get_catalog(None)  # type: ignore
+        assert versions["loads"] == 1
+
+    def test_structure_changes_by_other_processes_are_seen_immediately(self, versions):
+        get_catalog(None)  # type: ignore
+        versions["current"] = 2
+
+        assert get_catalog(None).version == 2  # type: ignore
+        assert versions["loads"] == 2
+
+    def test_invalidated_catalog_is_reloaded(self, versions):
+        get_catalog(None)  # type: ignore
+        invalidate_catalog()
+        get_catalog(None)  # type: ignore
+
+        assert versions["loads"] == 2
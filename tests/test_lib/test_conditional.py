@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from rss.lib.conditional import entity_tag, etag_matches
+
+
+class TestEntityTag:
+    def test_tag_is_strong_and_quoted(self):
+        tag = entity_tag("/api/v1/reports/events/1", 3)
+        assert tag.startswith('"') and tag.endswith('"')
+        assert not tag.startswith("W/")
+
+    def test_tag_is_stable(self):
+        modified = datetime(2024, 1, 1)
+        assert entity_tag("path", 3, modified) == entity_tag("path", 3, modified)
+
+    def test_tag_changes_with_its_parts(self):
+        assert entity_tag("path", 3) != entity_tag("path", 4)
+        assert entity_tag("path", [("page", "1")]) != entity_tag(
+            "path", [("page", "2")]
+        )
+
+
+class TestEtagMatches:
+    def test_missing_header_does_not_match(self):
+        assert not etag_matches(None, '"abc"')
+        assert not etag_matches("", '"abc"')
+
+    def test_exact_tag_matches(self):
+        assert etag_matches('"abc"', '"abc"')
+
+    def test_any_tag_in_list_matches(self):
+        assert etag_matches('"xyz", "abc"', '"abc"')
+
+    def test_weak_tag_matches(self):
+        assert etag_matches('W/"abc"', '"abc"')
+
+    def test_wildcard_matches(self):
+        assert etag_matches("*", '"abc"')
+
+    def test_other_tag_does_not_match(self):
+        assert not etag_matches('"xyz"', '"abc"')
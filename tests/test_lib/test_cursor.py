@@ -0,0 +1,18 @@
+import pytest
+
+from rss.lib.cursor import Cursor, CursorDirection
+
+
+class TestCursor:
+    def test_cursor_round_trips(self):
+        cursor = Cursor.decode(Cursor(CursorDirection.PREVIOUS, (12, 345)).encode())
+
+        assert cursor.direction is CursorDirection.PREVIOUS
+        assert cursor.key == (12, 345)
+
+    @pytest.mark.parametrize(
+        "encoded", ["not a cursor", "WyJzaWRld2F5cyIsIDEsIDJd", ""]
+    )
+    def test_malformed_cursor(self, encoded):
+        with pytest.raises(ValueError):
+            Cursor.decode(encoded)
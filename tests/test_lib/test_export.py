@@ -0,0 +1,91 @@
+import csv
+import io
+import json
+
+import pytest
+from sqlalchemy import select
+
+from rss.lib.catalog import invalidate_catalog
+from rss.lib.export import stream_csv, stream_ndjson
+from rss.models.instrument import Instrument
+from rss.models.project import ProjectArm, ProjectEvent, ProjectField, ProjectInstrument
+from rss.models.report import Report
+
+# (record_id, repeat_instance, weight) of each visit, inserted out of record order so row ids
+# do not follow it.
+VISITS = [(2, 1, "70"), (1, 1, "80"), (2, 2, "71"), (1, 2, "81")]
+
+
+@pytest.fixture
+def visits(db):
+    arm = ProjectArm(name="1")
+    baseline = ProjectEvent(name="baseline", arm=arm, repeating=False)
+    visits = ProjectInstrument(name="visits", repeating=True, events=[baseline])
+    db.add_all([arm, baseline, visits, ProjectField(name="weight", instrument=visits)])
+    db.flush()
+
+    db.add_all(
+        [
+            Instrument(
+                record_id=record_id,
+                event_id=baseline.id,
+                instrument_id=visits.id,
+                repeat_instance=repeat_instance,
+                data={"weight": weight, "notes": "omitted"},
+            )
+            for record_id, repeat_instance, weight in VISITS
+        ]
+    )
+    db.flush()
+    invalidate_catalog()
+
+    yield
+    db.rollback()
+    invalidate_catalog()
+
+
+def _report() -> Report:
+    return Report(
+        name="export",
+        records=[],
+        events=[],
+        instruments=[],
+        fields=["weight"],
+        filters={},
+        calculated_event_fields=[],
+        calculated_instrument_fields=[],
+    )
+
+
+class TestStreamCsv:
+    def test_rows_are_exported_in_record_order(self, db, visits):
+        exported = "".join(stream_csv(db, _report(), select(Instrument), Instrument))
+        header, *rows = csv.reader(io.StringIO(exported))
+
+        assert header == [
+            "record_id",
+            "event",
+            "instrument",
+            "repeat_instance",
+            "weight",
+        ]
+        assert rows == [
+            ["1", "baseline", "visits", "1", "80"],
+            ["1", "baseline", "visits", "2", "81"],
+            ["2", "baseline", "visits", "1", "70"],
+            ["2", "baseline", "visits", "2", "71"],
+        ]
+
+
+class TestStreamNdjson:
+    def test_rows_are_exported_in_record_order(self, db, visits):
+        exported = "".join(stream_ndjson(db, _report(), select(Instrument), Instrument))
+        rows = [json.loads(line) for line in exported.splitlines()]
+
+        assert [(row["recordId"], row["repeatInstance"]) for row in rows] == [
+            (1, 1),
+            (1, 2),
+            (2, 1),
+            (2, 2),
+        ]
+        assert rows[0]["data"] == {"weight": "80"}
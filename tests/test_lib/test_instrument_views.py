@@ -0,0 +1,56 @@
+import re
+from datetime import date
+
+import pytest
+from sqlalchemy import BigInteger, literal, select
+
+from rss.lib.instrument_views import (
+    INTEGER_PATTERN,
+    _field_type,
+    _typed_value,
+    create_cast_functions,
+)
+from rss.models.project import ProjectField
+
+
+class TestFieldType:
+    def test_integers_are_cast_to_bigint(self):
+        assert _field_type(ProjectField(validation="integer")) == (
+            BigInteger,
+            INTEGER_PATTERN,
+        )
+
+    def test_integers_beyond_bigint_range_are_not_cast(self):
+        assert re.match(INTEGER_PATTERN, "-" + "9" * 18)
+        assert not re.match(INTEGER_PATTERN, "9" * 19)
+
+
+class TestTypedValue:
+    @pytest.fixture
+    def typed(self, db):
+        create_cast_functions(db)
+
+        def typed(value: str, validation: str):
+            field = ProjectField(name="field", validation=validation)
+            return db.scalar(select(_typed_value(literal(value), field)))
+
+        yield typed
+        db.rollback()
+
+    def test_integers_beyond_int4_range_are_kept(self, typed):
+        assert typed("99999999999", "integer") == 99999999999
+
+    def test_integers_beyond_bigint_range_are_null(self, typed):
+        assert typed("99999999999999999999", "integer") is None
+
+    def test_impossible_dates_are_null(self, typed):
+        assert typed("2024-02-31", "date_ymd") is None
+        assert typed("2024-02-29", "date_ymd") == date(2024, 2, 29)
+
+    def test_impossible_datetimes_are_null(self, typed):
+        assert typed("2024-02-31 12:00", "datetime_ymd") is None
+        assert typed("2024-02-29 25:00", "datetime_ymd") is None
+
+    def test_malformed_values_are_null(self, typed):
+        assert typed("12a", "integer") is None
+        assert typed("", "date_ymd") is None
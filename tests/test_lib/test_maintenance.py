@@ -0,0 +1,125 @@
+import re
+
+from rss.lib.maintenance import (
+    PREFIX_INDEX_NAME_PATTERN,
+    STATISTICS_NAME_PATTERN,
+    _prefix_index_name,
+    _statistics_expression,
+    _statistics_name,
+    prefix_report_fields,
+)
+
+
+class TestStatisticsExpression:
+    def test_text_fields_are_not_cast(self):
+        assert _statistics_expression(("age", None)) == "(data ->> 'age')"
+
+    def test_cast_fields_match_compiled_comparisons(self):
+        assert (
+            _statistics_expression(("age", "integer"))
+            == "CAST((data ->> 'age') AS integer)"
+        )
+
+    def test_quotes_are_escaped(self):
+        assert _statistics_expression(("it's", None)) == "(data ->> 'it''s')"
+
+
+class TestStatisticsName:
+    def test_names_are_bounded_and_recognizable(self):
+        name = _statistics_name("instrument", ("a" * 100, "integer"))
+
+        assert len(name) <= 63
+        assert re.search(STATISTICS_NAME_PATTERN, name)
+
+    def test_casts_of_a_field_have_distinct_statistics(self):
+        assert _statistics_name("event", ("age", None)) != _statistics_name(
+            "event", ("age", "integer")
+        )
+
+
+class _Session:
+    def __init__(self, instruments: list[tuple[str, bool]], filters: list[dict]):
+        self.instruments = instruments
+        self.filters = filters
+
+    def execute(self, statement):
+        return self.instruments
+
+    def scalars(self, statement):
+        return self.filters
+
+
+class TestPrefixReportFields:
+    def test_prefix_fields_are_mapped_to_their_tables(self):
+        db = _Session(
+            [("demographics", False), ("visits", True)],
+            [
+                {
+                    "all": [
+                        {
+                            "instrument": "demographics",
+                            "field": "site",
+                            "operator": "prefix",
+                            "value": "A",
+                        },
+                        {
+                            "instrument": "visits",
+                            "field": "code",
+                            "operator": "prefix",
+                            "value": "B",
+                        },
+                        {
+                            "instrument": "visits",
+                            "field": "weight",
+                            "operator": ">",
+                            "value": 1,
+                        },
+                    ]
+                },
+                {
+                    "not": {
+                        "any": [
+                            {
+                                "instrument": "visits",
+                                "field": "lot",
+                                "operator": "prefix",
+                                "value": "C",
+                            }
+                        ]
+                    }
+                },
+            ],
+        )
+
+        assert prefix_report_fields(db) == {  # type: ignore
+            "event": {"site"},
+            "instrument": {"code", "lot"},
+        }
+
+    def test_unknown_instruments_are_skipped(self):
+        db = _Session(
+            [],
+            [
+                {
+                    "all": [
+                        {
+                            "instrument": "missing",
+                            "field": "site",
+                            "operator": "prefix",
+                            "value": "A",
+                        }
+                    ]
+                }
+            ],
+        )
+
+        assert prefix_report_fields(db) == {}  # type: ignore
+
+
+class TestPrefixIndexName:
+    def test_names_are_bounded_and_recognizable(self):
+        name = _prefix_index_name("instrument", "a" * 100)
+
+        assert len(name) <= 63
+        assert re.search(PREFIX_INDEX_NAME_PATTERN, name)
+        assert not re.search(STATISTICS_NAME_PATTERN, name)
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+from sqlalchemy import select
+from starlette.requests import Request
+
+from rss.deps import CountMode, PageAlignment, PaginatedParams
+from rss.lib.middlewares import request_object
+from rss.lib.pagination import paginate_json
+from rss.lib.report import report_items_json
+from rss.models.instrument import Instrument
+from rss.models.project import ProjectArm, ProjectEvent, ProjectInstrument
+
+# Three visits of record 1, followed by two of record 2 and one of record 3.
+VISITS = [1, 1, 1, 2, 2, 3]
+
+
+@pytest.fixture(autouse=True)
+def request_url():
+    token = request_object.set(
+        Request(
+            {
+                "type": "http",
+                "scheme": "http",
+                "server": ("test", 80),
+                "path": "/api/v1/reports/instruments/report",
+                "query_string": b"",
+                "headers": [],
+            }
+        )
+    )
+    yield
+    request_object.reset(token)
+
+
+@pytest.fixture
+def visits(db):
+    arm = ProjectArm(name="1")
+    baseline = ProjectEvent(name="baseline", arm=arm, repeating=False)
+    visits = ProjectInstrument(name="visits", repeating=True, events=[baseline])
+    db.add_all([arm, baseline, visits])
+    db.flush()
+
+    db.add_all(
+        [
+            Instrument(
+                record_id=record_id,
+                event_id=baseline.id,
+                instrument_id=visits.id,
+                repeat_instance=repeat_instance,
+                data={},
+            )
+            for repeat_instance, record_id in enumerate(VISITS, start=1)
+        ]
+    )
+    db.flush()
+
+    yield
+    db.rollback()
+
+
+def _page(db, per_page: int, align: PageAlignment, cursor=None) -> dict:
+    params = PaginatedParams(
+        page=1, per_page=per_page, cursor=cursor, align=align, count=CountMode.EXACT
+    )
+    return json.loads(
+        paginate_json(db, select(Instrument), params, report_items_json(Instrument))
+    )
+
+
+def _records(page: dict) -> list[int]:
+    return [item["recordId"] for item in page["items"]]
+
+
+class TestRecordAlignedPagination:
+    def test_pages_never_split_a_record(self, db, visits):
+        first = _page(db, 2, PageAlignment.RECORD)
+        second = _page(db, 2, PageAlignment.RECORD, first["nextCursor"])
+
+        assert _records(first) == [1, 1, 1, 2, 2]
+        assert _records(second) == [3]
+        assert second["nextCursor"] is None
+
+    def test_records_are_counted(self, db, visits):
+        page = _page(db, 2, PageAlignment.RECORD)
+
+        assert page["count"] == 3
+        assert page["pages"] == 2
+
+    def test_previous_cursor_returns_whole_records(self, db, visits):
+        first = _page(db, 2, PageAlignment.RECORD)
+        second = _page(db, 2, PageAlignment.RECORD, first["nextCursor"])
+        previous = _page(db, 2, PageAlignment.RECORD, second["previousCursor"])
+
+        assert _records(previous) == [1, 1, 1, 2, 2]
+
+    def test_row_aligned_pages_may_split_a_record(self, db, visits):
+        page = _page(db, 2, PageAlignment.ROW)
+
+        assert _records(page) == [1, 1]
+        assert page["count"] == 6
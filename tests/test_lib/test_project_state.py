@@ -0,0 +1,19 @@
+from rss.lib.project_state import fingerprint, fingerprint_project_structure
+
+
+class TestFingerprint:
+    def test_fingerprint_is_independent_of_key_order(self):
+        assert fingerprint({"a": 1, "b": [1, 2]}) == fingerprint({"b": [1, 2], "a": 1})
+
+    def test_fingerprint_changes_with_export(self):
+        assert fingerprint([{"form": "a"}]) != fingerprint([{"form": "b"}])
+
+    def test_structure_fingerprint_is_per_element(self):
+        structure = {"metadata": [{"field_name": "a"}], "field_names": []}
+        changed = {**structure, "field_names": [{"export_field_name": "a"}]}
+
+        original_fingerprint = fingerprint_project_structure(structure)
+        changed_fingerprint = fingerprint_project_structure(changed)
+
+        assert original_fingerprint["metadata"] == changed_fingerprint["metadata"]
+        assert original_fingerprint["field_names"] != changed_fingerprint["field_names"]
@@ -0,0 +1,270 @@
+import pytest
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from rss.lib.catalog import CatalogInstrument, SchemaCatalog
+from rss.lib.querybuilder import compiler, planner
+from rss.lib.querybuilder.cache import FILTER_CACHE_MAX_RECORDS, filter_cache
+from rss.lib.querybuilder.compiler import compile_filter, filter_clause
+from rss.models.event import Event
+
+
+@pytest.fixture
+def catalog():
+    instruments = {
+        "demographics": CatalogInstrument(1, "demographics", False, [1], ["age"]),
+        "visits": CatalogInstrument(2, "visits", True, [1, 2], ["weight"]),
+    }
+    return SchemaCatalog(
+        version=1,
+        events={"baseline": 1, "followup": 2},
+        instruments=instruments,
+        field_instruments={"age": "demographics", "weight": "visits"},
+    )
+
+
+def _sql(select) -> str:
+    return str(select.compile(dialect=postgresql.dialect()))
+
+
+class TestCompileFilter:
+    def test_empty_filter_is_unconstrained(self, catalog):
+        assert compile_filter(None, {}, catalog) is None
+
+    def test_single_criterion(self, catalog):
+        compiled = compile_filter(
+            None,
+            {
+                "all": [
+                    {
+                        "instrument": "demographics",
+                        "field": "age",
+                        "operator": ">",
+                        "value": 18,
+                    }
+                ]
+            },
+            catalog,
+        )
+
+        assert "INTERSECT" not in _sql(compiled)
+        assert "UNION" not in _sql(compiled)
+
+    def test_any_is_compiled_as_union(self, catalog):
+        compiled = compile_filter(
+            None,
+            {
+                "any": [
+                    {
+                        "instrument": "demographics",
+                        "field": "age",
+                        "operator": ">",
+                        "value": 18,
+                    },
+                    {
+                        "instrument": "visits",
+                        "field": "weight",
+                        "operator": "<",
+                        "value": 100,
+                    },
+                ]
+            },
+            catalog,
+        )
+
+        assert "UNION" in _sql(compiled)
+        assert "instrument.instrument_id" in _sql(compiled)
+
+    def test_invalid_aggregator(self, catalog):
+        with pytest.raises(ValueError):
+            compile_filter(None, {"some": []}, catalog)
+
+    def test_unknown_instrument(self, catalog):
+        with pytest.raises(ValueError):
+            compile_filter(
+                None,
+                {
+                    "all": [
+                        {
+                            "instrument": "missing",
+                            "field": "age",
+                            "operator": "==",
+                            "value": 1,
+                        }
+                    ]
+                },
+                catalog,
+            )
+
+    def test_records_are_pushed_into_criterions(self, catalog):
+        compiled = compile_filter(
+            None,
+            {
+                "all": [
+                    {
+                        "instrument": "demographics",
+                        "field": "age",
+                        "operator": ">",
+                        "value": 18,
+                    }
+                ]
+            },
+            catalog,
+            records=[1, 2],
+        )
+
+        assert "= ANY" in _sql(compiled)
+
+    def test_not_is_compiled_as_anti_join(self, catalog):
+        compiled = compile_filter(
+            None,
+            {
+                "all": [
+                    {
+                        "instrument": "demographics",
+                        "field": "age",
+                        "operator": ">",
+                        "value": 18,
+                    }
+                ],
+                "not": [
+                    {
+                        "instrument": "visits",
+                        "field": "weight",
+                        "operator": "is_null",
+                    }
+                ],
+            },
+            catalog,
+        )
+
+        assert "NOT (EXISTS" in _sql(compiled)
+
+    def test_not_without_siblings_excludes_from_every_record(self, catalog):
+        compiled = compile_filter(
+            None,
+            {
+                "not": {
+                    "any": [
+                        {
+                            "instrument": "visits",
+                            "field": "weight",
+                            "operator": "is_null",
+                        }
+                    ]
+                }
+            },
+            catalog,
+        )
+
+        assert "NOT (EXISTS" in _sql(compiled)
+        assert "FROM event) AS" in _sql(compiled)
+
+    def test_aggregate_criterions_are_grouped_by_record(self, catalog):
+        compiled = compile_filter(
+            None,
+            {
+                "all": [
+                    {
+                        "instrument": "visits",
+                        "aggregate": "count",
+                        "operator": ">=",
+                        "value": 3,
+                    }
+                ]
+            },
+            catalog,
+        )
+
+        assert "GROUP BY instrument.record_id" in _sql(compiled)
+        assert "HAVING count(*) >=" in _sql(compiled)
+
+    def test_all_is_driven_by_the_most_selective_criterion(self, catalog, monkeypatch):
+        monkeypatch.setattr(
+            planner,
+            "estimate_rows",
+            lambda db, statement: 10 if "FROM instrument" in _sql(statement) else 1000,
+        )
+
+        compiled = _sql(
+            compile_filter(
+                None,
+                {
+                    "all": [
+                        {
+                            "instrument": "demographics",
+                            "field": "age",
+                            "operator": ">",
+                            "value": 18,
+                        },
+                        {
+                            "instrument": "visits",
+                            "field": "weight",
+                            "operator": "<",
+                            "value": 100,
+                        },
+                    ]
+                },
+                catalog,
+            )
+        )
+
+        assert "INTERSECT" not in compiled
+        assert " IN (SELECT" in compiled
+        assert compiled.index("FROM instrument") < compiled.index("FROM event")
+
+
+class _Session:
+    def __init__(self, records: list[int]):
+        self.records = records
+        self.fetches = 0
+
+    def scalars(self, statement):
+        self.fetches += 1
+        return self
+
+    def all(self) -> list[int]:
+        return self.records
+
+
+class TestFilterClause:
+    filters = {"all": [{"instrument": "demographics", "field": "age"}]}
+
+    @pytest.fixture(autouse=True)
+    def cache(self, monkeypatch, catalog):
+        monkeypatch.setattr(compiler, "get_catalog", lambda db: catalog)
+        monkeypatch.setattr(compiler, "data_generation", lambda db: 1)
+
+        filter_cache.clear()
+        yield
+        filter_cache.clear()
+
+    def _clause(self, db) -> str:
+        return _sql(
+            filter_clause(
+                db, Event.record_id, self.filters, statement=select(Event.record_id)
+            )
+        )
+
+    def test_unseen_filters_are_evaluated_as_a_subquery(self):
+        db = _Session([1, 2])
+
+        assert "IN (SELECT" in self._clause(db)
+        assert db.fetches == 0
+
+    def test_repeated_filters_cache_their_records(self):
+        db = _Session([1, 2])
+        self._clause(db)
+
+        assert "= ANY" in self._clause(db)
+        assert "= ANY" in self._clause(db)
+        assert db.fetches == 1
+
+    def test_filters_passing_many_records_are_not_cached(self):
+        db = _Session(list(range(FILTER_CACHE_MAX_RECORDS + 1)))
+        self._clause(db)
+
+        assert "IN (SELECT" in self._clause(db)
+        assert "IN (SELECT" in self._clause(db)
+        assert db.fetches == 1
@@ -0,0 +1,80 @@
+import pytest
+
+from sqlalchemy.dialects import postgresql
+
+from rss.lib.catalog import CatalogInstrument, SchemaCatalog
+from rss.lib.querybuilder import explain, planner
+from rss.lib.querybuilder.cache import filter_cache, filter_cache_key
+from rss.lib.querybuilder.explain import explain_filter
+
+AGE = {"instrument": "demographics", "field": "age", "operator": ">", "value": 18}
+WEIGHT = {"instrument": "visits", "field": "weight", "operator": "<", "value": 100}
+
+
+class _Bind:
+    dialect = postgresql.dialect()
+
+
+class _Session:
+    def get_bind(self):
+        return _Bind()
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    catalog = SchemaCatalog(
+        version=1,
+        events={"baseline": 1, "followup": 2},
+        instruments={
+            "demographics": CatalogInstrument(1, "demographics", False, [1], ["age"]),
+            "visits": CatalogInstrument(2, "visits", True, [1, 2], ["weight"]),
+        },
+        field_instruments={"age": "demographics", "weight": "visits"},
+    )
+    plan = [{"Plan": {"Actual Rows": 1, "Plan Rows": 1}, "Execution Time": 0.1}]
+
+    monkeypatch.setattr(explain, "get_catalog", lambda db: catalog)
+    monkeypatch.setattr(explain, "data_generation", lambda db: 1)
+    monkeypatch.setattr(explain, "explain", lambda db, statement, options: plan)
+    monkeypatch.setattr(planner, "estimate_rows", lambda db, statement: 1)
+
+    filter_cache.clear()
+    yield catalog
+    filter_cache.clear()
+
+
+class TestExplainFilter:
+    def test_uncached_filters_are_not_cached(self, catalog):
+        explanation = explain_filter(_Session(), {"all": [AGE]})  # type: ignore
+
+        assert explanation["cached"] is False
+        assert explanation["children"][0]["cached"] is False
+        assert explanation["children"][0]["children"][0]["cached"] is None
+
+    def test_nested_filters_report_cached_equivalent_filters(self, catalog):
+        filter_cache.set(filter_cache_key(1, catalog, {"any": [WEIGHT]}), frozenset())
+        filter_cache.set(filter_cache_key(1, catalog, {"all": [AGE]}), frozenset())
+
+        explanation = explain_filter(
+            _Session(), {"all": [AGE], "not": {"any": [WEIGHT]}}  # type: ignore
+        )
+        aggregation, nested_filter = explanation["children"]
+
+        assert explanation["cached"] is False
+        assert aggregation["cached"] is True
+        assert nested_filter["cached"] is True
+        assert nested_filter["children"][0]["cached"] is True
+
+    def test_not_aggregations_match_any_filters(self, catalog):
+        filter_cache.set(filter_cache_key(1, catalog, {"any": [WEIGHT]}), frozenset())
+
+        explanation = explain_filter(_Session(), {"not": [WEIGHT]})  # type: ignore
+
+        assert explanation["children"][0]["cached"] is True
+
+    def test_markers_are_not_reported_as_cached(self, catalog):
+        filter_cache.set(filter_cache_key(1, catalog, {"all": [AGE]}), "seen")
+
+        explanation = explain_filter(_Session(), {"all": [AGE]})  # type: ignore
+
+        assert explanation["cached"] is False
@@ -0,0 +1,87 @@
+import pytest
+
+from sqlalchemy.dialects import postgresql
+
+from rss.lib.querybuilder.operators import aggregate_clause, comparison_clause
+from rss.models.instrument import Instrument
+
+
+def _sql(clause) -> str:
+    return str(
+        clause.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+class TestComparisonClause:
+    def test_in_is_a_single_predicate(self):
+        clause = comparison_clause("in", "site", ["A", "B", "C"], Instrument)
+
+        assert _sql(clause) == "(instrument.data ->> 'site') IN ('A', 'B', 'C')"
+
+    def test_list_values_are_cast_by_type(self):
+        clause = comparison_clause("not_in", "visit", [1, 2], Instrument)
+
+        assert "AS INTEGER" in _sql(clause)
+        assert "NOT IN (1, 2)" in _sql(clause)
+
+    def test_between(self):
+        clause = comparison_clause("between", "score", [1, 10], Instrument)
+
+        assert "BETWEEN 1 AND 10" in _sql(clause)
+
+    def test_between_requires_two_values(self):
+        with pytest.raises(ValueError):
+            comparison_clause("between", "score", [1], Instrument)
+
+    def test_list_operators_require_lists(self):
+        with pytest.raises(ValueError):
+            comparison_clause("in", "site", "A", Instrument)
+
+    def test_is_null_includes_empty_strings(self):
+        clause = comparison_clause("is_null", "site", None, Instrument)
+
+        assert "IS NULL" in _sql(clause)
+        assert "= ''" in _sql(clause)
+
+    def test_prefix_escapes_wildcards(self):
+        clause = comparison_clause("prefix", "site", "A_%/", Instrument)
+        compiled = clause.compile(dialect=postgresql.dialect())
+
+        assert "A/_/%//%" in compiled.params.values()
+        assert "ESCAPE '/'" in str(compiled)
+
+    def test_prefix_pattern_is_a_single_parameter(self):
+        clause = comparison_clause("prefix", "site", "A", Instrument)
+        compiled = clause.compile(dialect=postgresql.dialect())
+
+        assert "||" not in str(compiled)
+        assert "A%" in compiled.params.values()
+
+    def test_invalid_operator(self):
+        with pytest.raises(ValueError):
+            comparison_clause("~=", "site", "A", Instrument)
+
+
+class TestAggregateClause:
+    def test_count_without_field_counts_rows(self):
+        clause = aggregate_clause("count", ">=", None, 3, Instrument)
+
+        assert _sql(clause) == "count(*) >= 3"
+
+    def test_numeric_aggregates_are_cast(self):
+        clause = aggregate_clause("max", ">", "value", 10, Instrument)
+
+        assert (
+            "max(CAST(nullif((instrument.data ->> 'value'), '') AS NUMERIC)) > 10"
+            == _sql(clause)
+        )
+
+    def test_invalid_aggregate(self):
+        with pytest.raises(ValueError):
+            aggregate_clause("avg", ">", "value", 10, Instrument)
+
+    def test_unary_operators_are_not_aggregated(self):
+        with pytest.raises(ValueError):
+            aggregate_clause("max", "is_null", "value", None, Instrument)
@@ -1 +1,56 @@
-# TODO
+import pytest
+from sqlalchemy import select
+
+from rss.lib.redcap_interface import relational_redcap
+from rss.models.project import ProjectInstrument
+
+
+class _Project:
+    def __init__(self, repeating_instruments: list[dict[str, str]]):
+        self.repeating_instruments = repeating_instruments
+        self.metadata = [
+            {
+                "field_name": "weight",
+                "form_name": "visits",
+                "field_type": "text",
+                "text_validation_type_or_show_slider_number": "number",
+            }
+        ]
+
+    def export_instrument_event_mappings(self) -> list[dict[str, str]]:
+        return [{"arm_num": "1", "unique_event_name": "baseline", "form": "visits"}]
+
+    def export_repeating_instruments_events(self) -> list[dict[str, str]]:
+        return self.repeating_instruments
+
+    def export_field_names(self) -> list[dict[str, str]]:
+        return [{"original_field_name": "weight", "export_field_name": "weight"}]
+
+
+class TestRelationalRedcap:
+    @pytest.fixture
+    def session(self, db):
+        yield db
+        db.rollback()
+
+    def _repeating(self, db) -> bool:
+        return db.scalars(
+            select(ProjectInstrument.repeating).where(
+                ProjectInstrument.name == "visits"
+            )
+        ).one()
+
+    def test_unchanged_structure_is_not_synced(self, session):
+        assert relational_redcap(_Project([]), session)
+        assert not relational_redcap(_Project([]), session)
+
+    def test_existing_instruments_follow_repeating_changes(self, session):
+        relational_redcap(_Project([]), session)
+        assert not self._repeating(session)
+
+        repeating = [{"event_name": "baseline", "form_name": "visits"}]
+        assert relational_redcap(_Project(repeating), session)
+        assert self._repeating(session)
+
+        assert relational_redcap(_Project([]), session)
+        assert not self._repeating(session)
@@ -0,0 +1,169 @@
+import pytest
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from rss.lib import report
+from rss.lib.catalog import SchemaCatalog, invalidate_catalog
+from rss.lib.report import (
+    compact_report_items_json,
+    construct_report_select,
+    project_data,
+    report_count_key,
+)
+from rss.lib.report_plan import compile_report_plan
+from rss.models.event import Event
+from rss.models.event_record import EventRecord
+from rss.models.instrument import Instrument
+from rss.models.project import ProjectArm, ProjectEvent, ProjectField, ProjectInstrument
+from rss.models.report import Report
+
+
+def _sql(select) -> str:
+    return str(select.compile(dialect=postgresql.dialect()))
+
+
+class TestProjectData:
+    def test_data_is_not_projected_without_fields(self):
+        assert project_data(Event.data, []) is Event.data
+
+    def test_projection_is_chunked(self):
+        projection = project_data(Event.data, [f"field_{idx}" for idx in range(120)])
+
+        assert _sql(select(projection)).count("jsonb_build_object(") == 3
+        assert "jsonb_strip_nulls" in _sql(select(projection))
+
+
+class TestCompactReportItems:
+    def test_structure_is_listed_once_per_page(self):
+        page = select(Event).cte()
+        compiled = _sql(select(compact_report_items_json(Event)(page)))
+
+        assert "project_event.id IN" in compiled
+        assert "project_instrument.id IN" in compiled
+        assert "jsonb_object_keys" in compiled
+
+    def test_records_have_no_instruments(self):
+        page = select(EventRecord).cte()
+        compiled = _sql(select(compact_report_items_json(EventRecord, ["age"])(page)))
+
+        assert "project_instrument" not in compiled
+        assert "unnest" in compiled
+
+
+class TestReportCountKey:
+    @pytest.fixture(autouse=True)
+    def catalog(self, monkeypatch):
+        catalog = SchemaCatalog(1, {}, {}, {})
+        monkeypatch.setattr(report, "get_catalog", lambda db: catalog)
+
+    def _report(self, **kwargs) -> Report:
+        return Report(
+            **{"filters": {}, "records": [], "plan": {"version": 1}, **kwargs}
+        )
+
+    def test_key_is_stable(self):
+        assert report_count_key(None, self._report(), Event, 1) == report_count_key(
+            None, self._report(), Event, 1
+        )
+
+    def test_key_changes_with_generation_and_model(self):
+        key = report_count_key(None, self._report(), Event, 1)
+
+        assert key != report_count_key(None, self._report(), Event, 2)
+        assert key != report_count_key(None, self._report(), Instrument, 1)
+
+    def test_key_changes_with_records_and_plan(self):
+        key = report_count_key(None, self._report(), Event, 1)
+
+        assert key != report_count_key(None, self._report(records=[1]), Event, 1)
+        assert key != report_count_key(
+            None, self._report(plan={"version": 2}), Event, 1
+        )
+
+
+class TestConstructReportSelect:
+    @pytest.fixture
+    def project(self, db):
+        arm = ProjectArm(name="1")
+        baseline = ProjectEvent(name="baseline", arm=arm, repeating=False)
+        followup = ProjectEvent(name="followup", arm=arm, repeating=False)
+        visits = ProjectInstrument(
+            name="visits", repeating=False, events=[baseline, followup]
+        )
+        labs = ProjectInstrument(name="labs", repeating=False, events=[baseline])
+        db.add_all(
+            [
+                arm,
+                baseline,
+                followup,
+                visits,
+                labs,
+                ProjectField(name="weight", instrument=visits),
+                ProjectField(name="height", instrument=visits),
+                ProjectField(name="glucose", instrument=labs),
+            ]
+        )
+        db.flush()
+
+        db.add_all(
+            [
+                Instrument(
+                    record_id=record_id,
+                    event_id=event.id,
+                    instrument_id=instrument.id,
+                    data={},
+                )
+                for record_id in (1, 2)
+                for event, instrument in (
+                    (baseline, visits),
+                    (baseline, labs),
+                    (followup, visits),
+                )
+            ]
+        )
+        db.flush()
+        invalidate_catalog()
+
+        yield
+        db.rollback()
+        invalidate_catalog()
+
+    def _rows(self, db, **kwargs) -> list[tuple[int, str, str]]:
+        report = Report(
+            **{
+                "name": "scoped",
+                "records": [],
+                "events": [],
+                "instruments": [],
+                "fields": [],
+                "filters": {},
+                "calculated_event_fields": [],
+                "calculated_instrument_fields": [],
+                **kwargs,
+            }
+        )
+        report.plan = compile_report_plan(db, report)
+        report_query, _ = construct_report_select(db, report, Instrument, None, None)
+
+        return sorted(
+            (row.record_id, row.event.name, row.instrument.name)
+            for row in db.scalars(report_query)
+        )
+
+    def test_rows_are_scoped_to_events_and_instruments(self, db, project):
+        assert self._rows(
+            db, events=["baseline"], instruments=["visits"], fields=["weight", "height"]
+        ) == [(1, "baseline", "visits"), (2, "baseline", "visits")]
+
+    def test_rows_are_scoped_to_field_instruments(self, db, project):
+        assert self._rows(db, fields=["glucose"]) == [
+            (1, "baseline", "labs"),
+            (2, "baseline", "labs"),
+        ]
+
+    def test_rows_are_scoped_to_records(self, db, project):
+        assert self._rows(db, records=[2], fields=["weight", "height"]) == [
+            (2, "baseline", "visits"),
+            (2, "followup", "visits"),
+        ]
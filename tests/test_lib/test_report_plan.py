@@ -0,0 +1,144 @@
+import pytest
+
+from sqlalchemy.dialects import postgresql
+
+from rss.lib import report_plan
+from rss.lib.catalog import CatalogInstrument, SchemaCatalog
+from rss.lib.report_plan import compile_report_plan, filter_statement, is_current_plan
+from rss.models.report import Report
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    catalog = SchemaCatalog(
+        version=1,
+        events={"baseline": 1, "followup": 2},
+        instruments={
+            "demographics": CatalogInstrument(1, "demographics", False, [1], ["age"]),
+            "visits": CatalogInstrument(2, "visits", True, [1, 2], ["weight"]),
+        },
+        field_instruments={"age": "demographics", "weight": "visits"},
+    )
+    monkeypatch.setattr(report_plan, "get_catalog", lambda db: catalog)
+    return catalog
+
+
+def _report(**kwargs) -> Report:
+    return Report(
+        **{
+            "name": "report",
+            "records": [],
+            "events": [],
+            "instruments": [],
+            "fields": [],
+            "filters": {},
+            **kwargs,
+        }
+    )
+
+
+class TestCompileReportPlan:
+    def test_names_are_resolved_to_ids(self, catalog):
+        plan = compile_report_plan(
+            None, _report(events=["followup"], instruments=["visits"], fields=["age"])
+        )
+
+        assert plan["event_ids"] == [2]
+        assert plan["instrument_ids"] == [2]
+        assert plan["instrument_event_ids"] == [1, 2]
+        assert plan["field_instrument_ids"] == [1]
+        assert is_current_plan(catalog, plan)
+
+    def test_unknown_names_are_rejected(self, catalog):
+        with pytest.raises(ValueError):
+            compile_report_plan(None, _report(events=["missing"]))
+
+    def test_plan_is_stale_once_structure_changes(self, catalog):
+        plan = compile_report_plan(None, _report())
+        catalog.version = 2
+
+        assert not is_current_plan(catalog, plan)
+
+    def test_filter_statement_binds_parameters(self, catalog):
+        plan = compile_report_plan(
+            None,
+            _report(
+                records=[1, 2],
+                filters={
+                    "all": [
+                        {
+                            "instrument": "demographics",
+                            "field": "age",
+                            "operator": ">",
+                            "value": 18,
+                        }
+                    ]
+                },
+            ),
+        )
+
+        compiled = filter_statement(plan).compile(  # type: ignore
+            dialect=postgresql.psycopg2.dialect()
+        )
+
+        assert "::INTEGER[]" in str(compiled)
+        assert 18 in compiled.params.values()
+        assert [1, 2] in compiled.params.values()
+
+    def test_empty_filter_has_no_statement(self, catalog):
+        assert filter_statement(compile_report_plan(None, _report())) is None
+
+
+class _PlanSession:
+    statements: list = []
+    commits = 0
+
+    def __init__(self, bind):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, statement):
+        self.statements.append(statement)
+
+    def commit(self):
+        _PlanSession.commits += 1
+
+
+class _Session:
+    def get_bind(self):
+        return None
+
+
+class TestCurrentReportPlan:
+    @pytest.fixture
+    def plan_session(self, monkeypatch):
+        monkeypatch.setattr(report_plan, "Session", _PlanSession)
+        _PlanSession.statements, _PlanSession.commits = [], 0
+        return _PlanSession
+
+    def test_current_plan_is_not_recompiled(self, catalog, plan_session):
+        report = _report()
+        report.plan = compile_report_plan(None, report)
+
+        assert report_plan.current_report_plan(None, report) is report.plan  # type: ignore
+        assert plan_session.statements == []
+
+    def test_stale_plan_is_persisted_without_modifying_the_report(
+        self, catalog, plan_session
+    ):
+        report = _report(plan={"version": 0})
+
+        plan = report_plan.current_report_plan(_Session(), report)  # type: ignore
+        statement = plan_session.statements[0].compile(
+            dialect=postgresql.psycopg2.dialect()
+        )
+
+        assert is_current_plan(catalog, plan)
+        assert report.plan == plan
+        assert plan_session.commits == 1
+        assert "modified=report.modified" in str(statement)
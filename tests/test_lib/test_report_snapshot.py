@@ -0,0 +1,146 @@
+import pytest
+from sqlalchemy import Update, inspect, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DataError
+
+from rss.lib import report_snapshot
+from rss.lib.report_snapshot import (
+    materialize_report,
+    materialize_reports,
+    snapshot_select,
+)
+from rss.models.event import Event
+from rss.models.event_record import EventRecord
+from rss.models.instrument import Instrument
+from rss.models.report import Report
+
+
+@pytest.fixture(autouse=True)
+def generation(monkeypatch):
+    monkeypatch.setattr(report_snapshot, "data_generation", lambda db: 3)
+    monkeypatch.setattr(report_snapshot, "non_repeating_model", lambda: Event)
+
+
+def _report(**kwargs) -> Report:
+    return Report(
+        **{
+            "name": "report",
+            "calculated_event_fields": [],
+            "calculated_instrument_fields": [],
+            "materialized": True,
+            "snapshot_generation": 3,
+            **kwargs,
+        }
+    )
+
+
+class TestSnapshotSelect:
+    def test_current_snapshot_is_selected(self):
+        select = snapshot_select(None, _report(), Instrument)  # type: ignore
+        assert select is not None
+        assert "report_snapshot.model" in str(select)
+
+    def test_unmaterialized_report_is_not_served(self):
+        assert snapshot_select(None, _report(materialized=False), Event) is None  # type: ignore
+
+    def test_stale_snapshot_is_not_served(self):
+        assert snapshot_select(None, _report(snapshot_generation=2), Event) is None  # type: ignore
+
+    def test_unrendered_snapshot_is_not_served(self):
+        assert snapshot_select(None, _report(snapshot_generation=None), Event) is None  # type: ignore
+
+    def test_calculated_fields_are_rendered_live(self):
+        report = _report(calculated_instrument_fields=["count"])
+        assert snapshot_select(None, report, Instrument) is None  # type: ignore
+        assert snapshot_select(None, report, Event) is not None  # type: ignore
+
+    def test_unmaterialized_model_is_not_served(self):
+        assert snapshot_select(None, _report(), EventRecord) is None  # type: ignore
+
+
+class _Session:
+    def __init__(self, reports: list[Report]):
+        self.reports = reports
+        self.rollbacks = 0
+
+    def scalars(self, statement):
+        return self
+
+    def all(self) -> list[Report]:
+        return self.reports
+
+    def rollback(self) -> None:
+        self.rollbacks += 1
+
+
+class TestMaterializeReports:
+    def test_failing_report_does_not_abort_materialization(self, monkeypatch):
+        failing, stale, passing = (
+            _report(name="failing"),
+            _report(name="stale"),
+            _report(name="passing"),
+        )
+        materialized = []
+
+        def materialize_report(db, report):
+            if report is failing:
+                raise DataError("SELECT", {}, Exception("invalid input syntax"))
+            if report is stale:
+                raise ValueError("Field age is not defined on this project instance.")
+
+            materialized.append(report)
+            return 0
+
+        monkeypatch.setattr(report_snapshot, "materialize_report", materialize_report)
+        db = _Session([failing, stale, passing])
+
+        materialize_reports(db)  # type: ignore
+
+        assert materialized == [passing]
+        assert db.rollbacks == 2
+
+
+class _Result:
+    rowcount = 2
+
+
+class _MaterializeSession:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    def execute(self, statement):
+        self.statements.append(statement)
+        return _Result()
+
+    def commit(self) -> None:
+        self.commits += 1
+
+
+class TestMaterializeReport:
+    @pytest.fixture(autouse=True)
+    def report_select(self, monkeypatch):
+        monkeypatch.setattr(
+            report_snapshot, "current_report_plan", lambda db, report: {}
+        )
+        monkeypatch.setattr(
+            report_snapshot,
+            "construct_report_select",
+            lambda db, report, model, *args, **kwargs: (select(model), []),
+        )
+
+    def test_generation_is_persisted_without_modifying_the_report(self):
+        report = _report(snapshot_generation=None, fields=[])
+        db = _MaterializeSession()
+
+        assert materialize_report(db, report) == 4  # type: ignore
+
+        updates = [
+            statement for statement in db.statements if isinstance(statement, Update)
+        ]
+        compiled = str(updates[0].compile(dialect=postgresql.psycopg2.dialect()))
+
+        assert report.snapshot_generation == 3
+        assert db.commits == 1
+        assert "modified=report.modified" in compiled
+        assert not inspect(report).attrs.snapshot_generation.history.has_changes()
@@ -0,0 +1,53 @@
+from uuid import uuid4
+
+from rss.lib import response_cache
+from rss.lib.response_cache import MemoryResponseCache
+
+
+class TestMemoryResponseCache:
+    def test_get_returns_cached_page(self):
+        cache = MemoryResponseCache(2)
+        report = uuid4()
+        cache.set(report, '"a"', b"[]")
+
+        assert cache.get(report, '"a"') == b"[]"
+        assert cache.get(report, '"b"') is None
+        assert cache.stats()["hit_ratio"] == 0.5
+
+    def test_invalidate_report_removes_only_its_pages(self):
+        cache = MemoryResponseCache(4)
+        report, other = uuid4(), uuid4()
+        cache.set(report, '"a"', b"[]")
+        cache.set(report, '"b"', b"[]")
+        cache.set(other, '"a"', b"[]")
+
+        cache.invalidate_report(report)
+
+        assert cache.get(report, '"a"') is None
+        assert cache.get(report, '"b"') is None
+        assert cache.get(other, '"a"') == b"[]"
+        assert cache.stats()["invalidations"] == 2
+
+    def test_large_pages_are_not_cached(self, monkeypatch):
+        monkeypatch.setattr(response_cache, "RESPONSE_CACHE_MAX_BYTES", 2)
+        cache = MemoryResponseCache(2)
+        report = uuid4()
+        cache.set(report, '"a"', b"[1]")
+
+        assert cache.get(report, '"a"') is None
+
+    def test_evictions_are_counted(self):
+        cache = MemoryResponseCache(1)
+        report = uuid4()
+        cache.set(report, '"a"', b"[]")
+        cache.set(report, '"b"', b"[]")
+
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["size"] == 1
+
+    def test_clear_removes_every_page(self):
+        cache = MemoryResponseCache(2)
+        cache.set(uuid4(), '"a"', b"[]")
+        cache.clear()
+
+        assert cache.stats()["size"] == 0